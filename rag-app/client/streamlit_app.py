@@ -1,7 +1,26 @@
+import time
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 
+# Seconds a finished answer is reused for an identical question and settings
+ANSWER_TTL = 300
+# (connect, read) seconds for backend calls
+BACKEND_TIMEOUT = (3, 60)
+
+
+@st.cache_resource
+def get_backend_session():
+    """
+    One keep-alive session to the FastAPI backend, shared across reruns and users.
+    Streamlit re-executes this script on every interaction, so a module-level
+    session would be rebuilt (and its connections dropped) each time.
+    """
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=5, pool_maxsize=5))
+    return session
+
 
 def apply_custom_css():
     st.markdown("""
@@ -19,7 +38,11 @@ def apply_custom_css():
     """, unsafe_allow_html=True)
 
 
-def query_fastapi(query, top_k=5, max_tokens=200, temperature=0.7):
+def stream_fastapi(query, top_k=5, max_tokens=200, temperature=0.7):
+    """
+    Yields response text as it is generated, reading the Server-Sent Events that
+    /generate emits with stream=true. Errors are yielded as text so the chat shows them.
+    """
     url = "http://localhost:8000/generate"
     params = {
         "query": query,
@@ -27,14 +50,24 @@ def query_fastapi(query, top_k=5, max_tokens=200, temperature=0.7):
         "max_tokens": max_tokens,
         "temperature": temperature,
         "llm_provider": st.session_state.get("llm_provider"),
-        "embedding_provider": st.session_state.get("embedding_provider")
+        "embedding_provider": st.session_state.get("embedding_provider"),
+        "stream": "true"
     }
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        with get_backend_session().get(url, params=params, stream=True, timeout=BACKEND_TIMEOUT) as response:
+            response.raise_for_status()
+            data_lines = []
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: done"):
+                    return
+                if line.startswith("data: "):
+                    data_lines.append(line[6:])
+                elif line == "" and data_lines:
+                    # A blank line ends the event; multi-line tokens arrive as several data lines
+                    yield "\n".join(data_lines)
+                    data_lines = []
     except requests.exceptions.RequestException as e:
-        return {"error": str(e)}
+        yield f"⚠️ Error: {e}"
 
 
 def display_header():
@@ -107,8 +140,10 @@ def display_sidebar():
         if st.button("Rebuild Vector DB"):
             with st.spinner("🔄 Rebuilding vector DB..."):
                 try:
-                    response = requests.post(
+                    response = get_backend_session().post(
                         "http://localhost:8000/rebuild",
+                        # A rebuild re-embeds every paper, so only the connect is bounded
+                        timeout=(BACKEND_TIMEOUT[0], None),
                         params={
                             "json_dir": "./papers-downloads",
                             "output_file": "init/processed_papers.json",
@@ -124,6 +159,8 @@ def display_sidebar():
                     if result.get("status") == "success":
                         st.success(f"✅ {message}")
                         st.session_state["db_is_fresh"] = True
+                        # Answers came from the old table
+                        st.session_state["answers"] = {}
                     else:
                         st.error("❌ Rebuild incomplete or returned no message.")
                 except Exception as e:
@@ -146,6 +183,19 @@ def display_chat_message(message, role):
             st.caption(f"Sent at {message['timestamp']}")
 
 
+def _answer_key(query, top_k, max_tokens, temperature):
+    return (query, top_k, max_tokens, temperature,
+            st.session_state.get("llm_provider"), st.session_state.get("embedding_provider"))
+
+
+def cached_answer(key):
+    """Returns the answer already streamed for this exact question and settings, if still fresh."""
+    hit = st.session_state.setdefault("answers", {}).get(key)
+    if hit and time.monotonic() - hit[1] < ANSWER_TTL:
+        return hit[0]
+    return None
+
+
 def main():
     st.set_page_config(page_title="AI Assistant", page_icon="🤖",
                        layout="wide", initial_sidebar_state="expanded")
@@ -176,14 +226,22 @@ def main():
             st.session_state["messages"].append(user_message)
             display_chat_message(user_message, "user")
 
-            with st.spinner("Thinking..."):
-                response = query_fastapi(query, top_k, max_tokens, temperature)
-                answer = response.get(
-                    "response", f"⚠️ Error: {response.get('error', 'Unknown error')}")
-                assistant_message = {"role": "assistant",
-                                     "content": answer, "timestamp": timestamp}
-                st.session_state["messages"].append(assistant_message)
-                display_chat_message(assistant_message, "assistant")
+            # A repeated question is answered locally; otherwise render tokens as they
+            # arrive instead of waiting behind a spinner
+            key = _answer_key(query, top_k, max_tokens, temperature)
+            with st.chat_message("assistant"):
+                answer = cached_answer(key)
+                if answer is None:
+                    answer = st.write_stream(
+                        stream_fastapi(query, top_k, max_tokens, temperature))
+                    if isinstance(answer, str) and not answer.startswith("⚠️"):
+                        st.session_state["answers"][key] = (answer, time.monotonic())
+                else:
+                    st.markdown(answer)
+                st.caption(f"Sent at {timestamp}")
+            assistant_message = {"role": "assistant",
+                                 "content": answer, "timestamp": timestamp}
+            st.session_state["messages"].append(assistant_message)
 
 
 if __name__ == "__main__":
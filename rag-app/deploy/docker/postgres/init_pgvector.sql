@@ -24,4 +24,13 @@ CREATE TABLE IF NOT EXISTS papers (
     summary TEXT NOT NULL,
     chunk TEXT NOT NULL,
     embedding vector(384)
-);
\ No newline at end of file
+);
+
+/* Approximate-nearest-neighbour index for inner-product (<#>) retrieval over unit-length embeddings */
+CREATE INDEX IF NOT EXISTS papers_embedding_hnsw
+    ON papers USING hnsw (embedding vector_ip_ops)
+    WITH (m = 16, ef_construction = 64);
+
+/* Parallel sequential scans for queries the HNSW index can't serve; the per-gather
+ * worker limit is set on the server command line in docker-compose.yaml */
+ALTER TABLE papers SET (parallel_workers = 4);
@@ -1,4 +1,6 @@
 
+-- Parallel workers per gather are a server setting (postgres -c max_parallel_workers_per_gather,
+-- see deploy/docker/docker-compose.yaml); only the per-table hint belongs here.
 CREATE EXTENSION IF NOT EXISTS vector;
 
 DROP TABLE IF EXISTS papers;
@@ -10,3 +12,9 @@ CREATE TABLE IF NOT EXISTS papers (
     chunk TEXT NOT NULL,
     embedding vector(1024)
 );
+
+CREATE INDEX IF NOT EXISTS papers_embedding_hnsw
+    ON papers USING hnsw (embedding vector_ip_ops)
+    WITH (m = 16, ef_construction = 64);
+
+ALTER TABLE papers SET (parallel_workers = 4);
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field, SecretStr
-from typing import Optional  # ✅ needed for session_token
+from typing import Literal, Optional  # ✅ needed for session_token
 
 
 class Settings(BaseSettings):
@@ -15,6 +15,14 @@ class Settings(BaseSettings):
     postgres_db: str = Field(..., env="POSTGRES_DB")
     postgres_user: str = Field(..., env="POSTGRES_USER")
     postgres_password: str = Field(..., env="POSTGRES_PASSWORD")
+    hnsw_ef_search: int = Field(40, env="HNSW_EF_SEARCH")
+    vector_index: Literal["hnsw", "ivfflat"] = Field(
+        "hnsw", env="VECTOR_INDEX")  # ivfflat = faster build, smaller index, lower recall
+    ivfflat_probes: int = Field(10, env="IVFFLAT_PROBES")
+    embedding_storage: Literal["vector", "halfvec"] = Field(
+        "vector", env="EMBEDDING_STORAGE")  # halfvec = fp16, half the bytes (pgvector >= 0.7)
+    vector_backend: Literal["pgvector", "faiss"] = Field(
+        "pgvector", env="VECTOR_BACKEND")  # faiss = in-memory mirror, needs the faiss group
 
     # ─── Ingestion ─────────────────────────────────────────────
     arxiv_api_url: str = Field(..., env="ARXIV_API_URL")
@@ -26,6 +34,11 @@ class Settings(BaseSettings):
     temperature: float = Field(..., env="TEMPERATURE")
     top_p: float = Field(..., env="TOP_P")
     max_tokens: int = Field(..., env="MAX_TOKENS")
+    max_input_tokens: int = Field(
+        16000, env="MAX_INPUT_TOKENS")  # prompt + reply budget per LLM call
+    semantic_cache_enabled: bool = Field(False, env="SEMANTIC_CACHE_ENABLED")
+    semantic_cache_threshold: float = Field(
+        0.95, env="SEMANTIC_CACHE_THRESHOLD")  # cosine similarity for a paraphrase hit
 
     # ─── OpenAI ────────────────────────────────────────────────
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
@@ -47,10 +60,17 @@ class Settings(BaseSettings):
     ollama_model: str = Field(..., env="OLLAMA_MODEL")
     ollama_embedding_model: str = Field(..., env="OLLAMA_EMBEDDING_MODEL")
 
+    # ─── Local embedding runtime ───────────────────────────────
+    embedding_onnx_path: Optional[str] = Field(
+        None, env="EMBEDDING_ONNX_PATH")  # exported via `make export-onnx`
+    embed_batch_window_ms: float = Field(
+        0, env="EMBED_BATCH_WINDOW_MS")  # >0 coalesces concurrent query embeddings
+
     # ─── Tracing (Opik) ─────────────────────────────────────────
     opik_api_key: str = Field(..., env="OPIK_API_KEY")
     opik_workspace: str = Field(..., env="OPIK_WORKSPACE")
     opik_project_name: str = Field(..., env="OPIK_PROJECT_NAME")
+    enable_tracing: bool = Field(True, env="ENABLE_TRACING")
 
     rag_config: dict = {}
 
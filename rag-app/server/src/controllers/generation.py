@@ -1,14 +1,29 @@
+import asyncio
+import logging
+from typing import Iterator
 from fastapi import APIRouter, HTTPException, Query
-from services.generation_service import generate_response
-from services.retrieval_service import retrieve_top_k_chunks
+from fastapi.responses import StreamingResponse
+from server.src.services.generation_service import agenerate_response, generate_response_stream
+from server.src.services.query_expansion_service import expand_and_generate
+from server.src.services.retrieval_service import embed_query, retrieve_top_k_chunks
 from server.src.config import settings
-import traceback
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def to_sse(tokens: Iterator[str]) -> Iterator[str]:
+    """
+    Wraps each streamed token in a Server-Sent-Events `data:` frame.
+    Multi-line tokens are split so every line carries its own `data:` prefix.
+    """
+    for token in tokens:
+        yield "".join(f"data: {line}\n" for line in token.split("\n")) + "\n"
+    yield "event: done\ndata: \n\n"
 
 
 @router.get("/generate")
-def generate(
+async def generate(
     query: str,
     top_k: int = 5,
     max_tokens: int = 200,
@@ -16,6 +31,10 @@ def generate(
     llm_provider: str = Query(None, description="Override LLM provider"),
     embedding_provider: str = Query(
         None, description="Override embedding provider"),
+    stream: bool = Query(
+        False, description="Stream the response as Server-Sent Events"),
+    expand: bool = Query(
+        False, description="Expand the query and answer it in one LLM call (non-streaming only)"),
 ):
     """
     FastAPI endpoint to generate a response from user query using top-k RAG retrieval.
@@ -28,9 +47,9 @@ def generate(
         if embedding_provider:
             settings.embedding_provider = embedding_provider
 
-        print(f"🧪 Received query: {query}")
-        print(
-            f"🔁 Using LLM: {settings.llm_provider} | Embedding: {settings.embedding_provider}")
+        logger.debug("🧪 Received query: %s", query)
+        logger.debug("🔁 Using LLM: %s | Embedding: %s",
+                     settings.llm_provider, settings.embedding_provider)
 
         # Step 1: Retrieve relevant chunks
         db_config = {
@@ -41,13 +60,33 @@ def generate(
             "port": settings.postgres_port,
         }
 
-        chunks = retrieve_top_k_chunks(query, top_k=top_k, db_config=db_config)
-        print(f"🧪 Retrieved {len(chunks)} chunks")
+        # Retrieval is blocking (pooled psycopg2), so keep it off the event loop
+        chunks = await asyncio.to_thread(
+            retrieve_top_k_chunks, query, top_k=top_k, db_config=db_config)
+        logger.debug("🧪 Retrieved %d chunks", len(chunks))
+
+        # embed_query is memoised, so this is the embedding retrieval just used; a
+        # cache miss (e.g. the entry expired) would embed, so it too runs in a thread
+        query_embedding = (await asyncio.to_thread(embed_query, query)
+                           if settings.semantic_cache_enabled else None)
 
         # Step 2: Generate a response using the retrieved context
-        result = generate_response(
-            query, chunks, max_tokens=max_tokens, temperature=temperature)
-        print("🧪 generate_response returned:", result)
+        if stream:
+            return StreamingResponse(
+                to_sse(generate_response_stream(
+                    query, chunks, max_tokens=max_tokens, temperature=temperature,
+                    query_embedding=query_embedding)),
+                media_type="text/event-stream"
+            )
+
+        if expand:
+            return await asyncio.to_thread(
+                expand_and_generate, query, chunks, max_tokens=max_tokens, temperature=temperature)
+
+        result = await agenerate_response(
+            query, chunks, max_tokens=max_tokens, temperature=temperature,
+            query_embedding=query_embedding)
+        logger.debug("🧪 generate_response returned: %s", result)
 
         if not result or "response" not in result:
             raise ValueError(f"Missing 'response' in LLM result: {result}")
@@ -55,7 +94,6 @@ def generate(
         return result
 
     except Exception as e:
-        print("❌ Exception in /generate endpoint:")
-        traceback.print_exc()
+        logger.exception("❌ Exception in /generate endpoint")
         raise HTTPException(
             status_code=500, detail=f"Error generating response: {e}")
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Query, HTTPException, Request
 from server.src.services import ingestion_service
 from server.src.config import settings
+from server.src.services.retrieval_service import clear_retrieval_cache
+from server.src.services.semantic_cache import clear_semantic_cache
 from datetime import datetime, timezone
 
 router = APIRouter()
@@ -12,8 +14,10 @@ def rebuild_vector_store(
     json_dir: str = Query(..., description="Directory containing JSON files"),
     output_file: str = Query("init/processed_papers.json",
                              description="Path to save processed papers"),
-    chunk_size: int = Query(512, description="Chunk size for splitting text"),
-    overlap: int = Query(50, description="Token overlap between chunks")
+    chunk_size: int = Query(
+        512, description="Chunk length: model tokens for sentence-transformer "
+                         "(capped at the model's input length), whitespace words otherwise"),
+    overlap: int = Query(50, description="Overlap between chunks, in the same unit as chunk_size")
 ):
     """
     API endpoint to rebuild the vector DB using the current or overridden embedding provider.
@@ -26,15 +30,16 @@ def rebuild_vector_store(
             settings.embedding_provider = provider_override
 
         # 🚀 Kick off the full rebuild
-        ingestion_service.rebuild_vector_db(
+        dim = ingestion_service.rebuild_vector_db(
             json_dir=json_dir,
             output_file=output_file,
             chunk_size=chunk_size,
             overlap=overlap
         )
 
-        # 🧠 Dimension is detected inside rebuild_vector_db(), but we'll return it again here
-        dim = ingestion_service.detect_embedding_dim()
+        # Cached top-k results (and answers built on them) point at rows that no longer exist
+        clear_retrieval_cache()
+        clear_semantic_cache()
 
         return {
             "status": "success",
@@ -1,25 +1,10 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import List
-from services.retrieval_service import retrieve_top_k_chunks
-from models.document import Document, RetrievedDocument
-from dotenv import load_dotenv
-import os
+from server.src.services.retrieval_service import retrieve_top_k_chunks
+from server.src.models.document import Document, RetrievedDocument
+from server.src.config import settings
 import opik
 
-load_dotenv()
-
-DATA_PATH = os.getenv("DATA_PATH")
-
-# TODO: this should leverage the settings ingestor.
-# Database connection configuration
-db_config = {
-    "dbname": os.environ.get("POSTGRES_DB"),
-    "user": os.environ.get("POSTGRES_USER"),
-    "password": os.environ.get("POSTGRES_PASSWORD"),
-    "host": os.environ.get("POSTGRES_HOST"),
-    "port": os.environ.get("POSTGRES_PORT"),
-}
-
 router = APIRouter()
 
 
@@ -41,6 +26,15 @@ async def retrieve_top_k_chunks_endpoint(
     Returns:
         List[Document]: A list of the top retrieved chunks.
     """
+    # Settings already read .env once at startup; no per-module dotenv parse needed
+    db_config = {
+        "dbname": settings.postgres_db,
+        "user": settings.postgres_user,
+        "password": settings.postgres_password,
+        "host": settings.postgres_host,
+        "port": settings.postgres_port,
+    }
+
     try:
         # TODO: Tried using await but retrieve top k is not async, can try adapting to use asyncpg in future.
         chunks = retrieve_top_k_chunks(query, top_k, db_config=db_config)
@@ -1,22 +1,22 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import Iterator, List, Optional, Tuple
+import asyncio
+import numpy as np
 import os
 import json
-import requests
+import httpx
+import orjson
+from server.src.utils.bedrock_client_factory import get_bedrock_client
+from server.src.utils.http_client import (
+    DEFAULT_TIMEOUT, apost, get_async_http_client, get_http_session, new_async_http_client)
 from server.src.ingestion.utils import read_json_files, save_processed_papers_to_file
 from server.src.config import settings
+from server.src.services.retrieval_service import (
+    embed_queries, embed_token_ids, embedding_token_limit, tokenize_for_embedding)
 import dotenv
 
 dotenv.load_dotenv()
 DATA_PATH = os.getenv('DATA_PATH')
 
-# ─────────────────────────────────────────────────────────────
-# 🧠 Load default local model (used only if provider = sentence-transformer)
-# ─────────────────────────────────────────────────────────────
-model = None
-if settings.embedding_provider == "sentence-transformer":
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-
 
 def chunk_text(text: str, max_length: int = 512, overlap: int = 50) -> List[str]:
     words = text.split()
@@ -32,7 +32,158 @@ def chunk_text(text: str, max_length: int = 512, overlap: int = 50) -> List[str]
     return chunks
 
 
-def generate_embeddings(text_chunks: List[str]) -> List[List[float]]:
+def chunk_tokens(text: str, max_length: int = 512, overlap: int = 50) -> Tuple[List[str], List[List[int]]]:
+    """
+    Token-window counterpart of chunk_text for the local sentence-transformer.
+
+    Windows are cut from one tokenization of `text` with the model's tokenizer and
+    capped at the model's sequence length, so no chunk is silently truncated when
+    embedded. Each chunk is the exact source span its tokens cover, and its token
+    ids are returned alongside for embed_token_ids.
+    """
+    if overlap >= max_length:
+        raise ValueError(
+            "Overlap must be smaller than the maximum chunk length.")
+    ids, offsets, model_limit = tokenize_for_embedding(text)
+    if max_length > model_limit:
+        # Keep the overlap from swallowing the window once it is capped to the model
+        max_length, overlap = model_limit, min(overlap, model_limit // 2)
+    step = max_length - overlap
+
+    chunks, chunk_ids = [], []
+    for start in range(0, len(ids), step):
+        end = min(start + max_length, len(ids))
+        chunks.append(text[offsets[start][0]:offsets[end - 1][1]])
+        chunk_ids.append(ids[start:end])
+        if end == len(ids):
+            break
+    return chunks, chunk_ids
+
+
+def l2_normalize(embeddings) -> np.ndarray:
+    """
+    Scales each embedding row to unit length (float32).
+
+    Retrieval ranks by inner product (`<#>`), which equals cosine similarity only
+    for unit vectors, so every embedding written to pgvector must pass through here.
+    """
+    arr = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+
+# ─────────────────────────────────────────────────────────────
+# 🧠 Per-provider embedding handlers
+# ─────────────────────────────────────────────────────────────
+_OPENAI_MAX_INPUTS = 2048  # per-request input cap of the embeddings endpoint
+_COHERE_MAX_TEXTS = 96
+
+
+def _embed_sentence_transformer(text_chunks: List[str]):
+    # Shared cached model, batched and length-sorted
+    return embed_queries(text_chunks)
+
+
+def _embed_openai(text_chunks: List[str]) -> List[List[float]]:
+    headers = {
+        "Authorization": f"Bearer {settings.openai_api_key}",
+        "Content-Type": "application/json"
+    }
+    url = "https://api.openai.com/v1/embeddings"
+    model = settings.openai_embedding_model
+    # Native batch form: one round-trip per 2048 inputs instead of one per chunk
+    embeddings = []
+    for start in range(0, len(text_chunks), _OPENAI_MAX_INPUTS):
+        data = orjson.loads(get_http_session().post(url, headers=headers, json={
+            "input": text_chunks[start:start + _OPENAI_MAX_INPUTS],
+            "model": model
+        }, timeout=DEFAULT_TIMEOUT).content)["data"]
+        embeddings.extend(item["embedding"] for item in sorted(data, key=lambda item: item["index"]))
+    return embeddings
+
+
+def _embed_bedrock(text_chunks: List[str]) -> List[List[float]]:
+    client = get_bedrock_client()
+    model_id = settings.bedrock_embedding_model_id
+    return [
+        orjson.loads(client.invoke_model(
+            modelId=model_id,
+            body=orjson.dumps({"inputText": chunk}),
+            contentType="application/json",
+            accept="application/json"
+        )["body"].read())["embedding"]
+        for chunk in text_chunks
+    ]
+
+
+def _embed_huggingface(text_chunks: List[str]) -> List[List[float]]:
+    headers = {"Authorization": f"Bearer {settings.huggingface_api_key}"}
+    url = f"https://api-inference.huggingface.co/pipeline/feature-extraction/{settings.huggingface_model}"
+    return [
+        orjson.loads(get_http_session().post(
+            url,
+            headers=headers,
+            json={"inputs": chunk},
+            timeout=DEFAULT_TIMEOUT
+        ).content)[0]
+        for chunk in text_chunks
+    ]
+
+
+def _embed_cohere(text_chunks: List[str]) -> List[List[float]]:
+    headers = {"Authorization": f"Bearer {settings.cohere_api_key}"}
+    return [
+        embedding
+        for start in range(0, len(text_chunks), _COHERE_MAX_TEXTS)
+        for embedding in orjson.loads(get_http_session().post(
+            "https://api.cohere.ai/v1/embed",
+            headers=headers,
+            json={"texts": text_chunks[start:start + _COHERE_MAX_TEXTS]},
+            timeout=DEFAULT_TIMEOUT
+        ).content)["embeddings"]
+    ]
+
+
+def _embed_google(text_chunks: List[str]) -> List[List[float]]:
+    # ✅ Google Gemini embedding (text-embedding-004)
+    url = f"https://generativelanguage.googleapis.com/v1/models/{settings.google_embedding_model}:embedContent?key={settings.google_api_key}"
+    headers = {"Content-Type": "application/json"}
+    embeddings = []
+
+    for chunk in text_chunks:
+        body = {
+            "content": {
+                "parts": [{"text": chunk}]
+            }
+        }
+        response = get_http_session().post(url, headers=headers, json=body, timeout=DEFAULT_TIMEOUT)
+        result = orjson.loads(response.content)
+
+        if "embedding" not in result or "values" not in result["embedding"]:
+            print(
+                f"❌ Google error: missing 'embedding.values'. Full response:\n{json.dumps(result, indent=2)}"
+            )
+            raise ValueError(
+                "Missing 'embedding.values' in Google embedding response")
+
+        embeddings.append(result["embedding"]["values"])
+
+    return embeddings
+
+
+# Looked up per call: /generate and /rebuild can switch the provider at runtime
+_EMBEDDERS = {
+    "sentence-transformer": _embed_sentence_transformer,
+    "openai": _embed_openai,
+    "bedrock": _embed_bedrock,
+    "huggingface": _embed_huggingface,
+    "cohere": _embed_cohere,
+    "google": _embed_google,
+}
+
+
+def generate_embeddings(text_chunks: List[str], override_provider: Optional[str] = None) -> List[List[float]]:
     """
     Dispatch to appropriate embedding provider based on config.
     Supports:
@@ -43,93 +194,121 @@ def generate_embeddings(text_chunks: List[str]) -> List[List[float]]:
     - cohere
     - google (text-embedding-004)
     """
-    provider = settings.embedding_provider
+    provider = override_provider or settings.embedding_provider
+    try:
+        embed = _EMBEDDERS[provider]
+    except KeyError:
+        raise ValueError(f"❌ Unsupported embedding provider: {provider}") from None
+    return embed(text_chunks)
 
-    if provider == "sentence-transformer":
-        return model.encode(text_chunks, convert_to_tensor=False)
 
-    elif provider == "openai":
-        headers = {
-            "Authorization": f"Bearer {settings.openai_api_key}",
-            "Content-Type": "application/json"
-        }
-        url = "https://api.openai.com/v1/embeddings"
-        return [
-            requests.post(url, headers=headers, json={
-                "input": chunk,
-                "model": settings.openai_embedding_model
-            }).json()["data"][0]["embedding"]
-            for chunk in text_chunks
-        ]
-
-    elif provider == "bedrock":
-        import boto3
-        client = boto3.client(
-            "bedrock-runtime", region_name=settings.aws_region)
-        return [
-            json.loads(client.invoke_model(
-                modelId=settings.bedrock_embedding_model_id,
-                body=json.dumps({"inputText": chunk}),
-                contentType="application/json",
-                accept="application/json"
-            )["body"].read())["embedding"]
-            for chunk in text_chunks
-        ]
-
-    elif provider == "huggingface":
-        headers = {"Authorization": f"Bearer {settings.huggingface_api_key}"}
-        return [
-            requests.post(
-                f"https://api-inference.huggingface.co/pipeline/feature-extraction/{settings.huggingface_model}",
-                headers=headers,
-                json={"inputs": chunk}
-            ).json()[0]
-            for chunk in text_chunks
-        ]
-
-    elif provider == "cohere":
-        headers = {"Authorization": f"Bearer {settings.cohere_api_key}"}
-        return [
-            requests.post(
-                "https://api.cohere.ai/v1/embed",
-                headers=headers,
-                json={"texts": [chunk]}
-            ).json()["embeddings"][0]
-            for chunk in text_chunks
-        ]
-
-    elif provider == "google":
-        # ✅ Google Gemini embedding (text-embedding-004)
-        url = f"https://generativelanguage.googleapis.com/v1/models/{settings.google_embedding_model}:embedContent?key={settings.google_api_key}"
-        headers = {"Content-Type": "application/json"}
-        embeddings = []
-
-        for chunk in text_chunks:
-            body = {
-                "content": {
-                    "parts": [{"text": chunk}]
-                }
-            }
-            response = requests.post(url, headers=headers, json=body)
-            result = response.json()
+# ─────────────────────────────────────────────────────────────
+# ⚡ Async batch embedding (network-bound providers run concurrently)
+# ─────────────────────────────────────────────────────────────
+# Embedding requests in flight at once during ingestion; the rest wait their turn
+# instead of all hitting the provider's rate limit together
+_MAX_CONCURRENT_EMBEDS = 32
 
-            if "embedding" not in result or "values" not in result["embedding"]:
-                print(
-                    f"❌ Google error: missing 'embedding.values'. Full response:\n{json.dumps(result, indent=2)}"
-                )
-                raise ValueError(
-                    "Missing 'embedding.values' in Google embedding response")
 
-            embeddings.append(result["embedding"]["values"])
+async def _aembed_openai(client: httpx.AsyncClient, text_chunks: List[str]) -> List[List[float]]:
+    # Native batch form: one round-trip per 2048 inputs instead of one per chunk
+    headers = {
+        "Authorization": f"Bearer {settings.openai_api_key}",
+        "Content-Type": "application/json"
+    }
+    responses = await asyncio.gather(*[
+        apost(client, "https://api.openai.com/v1/embeddings", headers=headers, json={
+            "input": text_chunks[start:start + _OPENAI_MAX_INPUTS],
+            "model": settings.openai_embedding_model
+        })
+        for start in range(0, len(text_chunks), _OPENAI_MAX_INPUTS)
+    ])
+    embeddings = []
+    for response in responses:
+        data = sorted(orjson.loads(response.content)["data"], key=lambda item: item["index"])
+        embeddings.extend(item["embedding"] for item in data)
+    return embeddings
 
-        return embeddings
 
-    else:
-        raise ValueError(f"❌ Unsupported embedding provider: {provider}")
+async def _aembed_huggingface(client: httpx.AsyncClient, text_chunks: List[str]) -> List[List[float]]:
+    headers = {"Authorization": f"Bearer {settings.huggingface_api_key}"}
+    url = f"https://api-inference.huggingface.co/pipeline/feature-extraction/{settings.huggingface_model}"
+    responses = await asyncio.gather(*[
+        apost(client, url, headers=headers, json={"inputs": chunk})
+        for chunk in text_chunks
+    ])
+    return [orjson.loads(response.content)[0] for response in responses]
 
 
-def process_papers(papers: List[dict], chunk_size: int = 512, overlap: int = 50) -> List[dict]:
-    processed = []
+async def _aembed_cohere(client: httpx.AsyncClient, text_chunks: List[str]) -> List[List[float]]:
+    headers = {"Authorization": f"Bearer {settings.cohere_api_key}"}
+    responses = await asyncio.gather(*[
+        apost(client, "https://api.cohere.ai/v1/embed", headers=headers, json={
+            "texts": text_chunks[start:start + _COHERE_MAX_TEXTS]
+        })
+        for start in range(0, len(text_chunks), _COHERE_MAX_TEXTS)
+    ])
+    return [emb for response in responses for emb in orjson.loads(response.content)["embeddings"]]
+
+
+async def _aembed_google(client: httpx.AsyncClient, text_chunks: List[str]) -> List[List[float]]:
+    url = f"https://generativelanguage.googleapis.com/v1/models/{settings.google_embedding_model}:embedContent?key={settings.google_api_key}"
+    responses = await asyncio.gather(*[
+        apost(client, url, json={"content": {"parts": [{"text": chunk}]}})
+        for chunk in text_chunks
+    ])
+    embeddings = []
+    for response in responses:
+        result = orjson.loads(response.content)
+        if "embedding" not in result or "values" not in result["embedding"]:
+            raise ValueError(
+                "Missing 'embedding.values' in Google embedding response")
+        embeddings.append(result["embedding"]["values"])
+    return embeddings
+
+
+_ASYNC_EMBEDDERS = {
+    "openai": _aembed_openai,
+    "huggingface": _aembed_huggingface,
+    "cohere": _aembed_cohere,
+    "google": _aembed_google,
+}
+
+
+async def generate_embeddings_async(text_chunks: List[str]):
+    """
+    Async counterpart of generate_embeddings for batches.
+
+    HTTP providers issue their requests concurrently over one pooled client (and use
+    the provider's native batch form where it has one). CPU-bound sentence-transformer
+    and the boto3-based bedrock path run the sync handler in a worker thread.
+    """
+    provider = settings.embedding_provider
+    handler = _ASYNC_EMBEDDERS.get(provider)
+    if handler is None:
+        return await asyncio.to_thread(generate_embeddings, text_chunks)
+
+    return await handler(get_async_http_client(), text_chunks)
+
+
+# Chunks embedded per generate_embeddings call during ingestion. Whole papers are
+# grouped up to this size so remote providers see a few large requests, not one per paper.
+_INGEST_BATCH_CHUNKS = 256
+
+
+def _group_papers(papers: List[dict], chunk_size: int, overlap: int) -> Iterator[List[dict]]:
+    """
+    Chunks each paper and yields groups of whole papers totalling ~_INGEST_BATCH_CHUNKS chunks.
+
+    For the local sentence-transformer, papers are chunked by model tokens and keep
+    the token ids under "chunk_ids" so _embed_group can skip re-tokenizing them.
+    """
+    by_tokens = settings.embedding_provider == "sentence-transformer"
+    if by_tokens:
+        limit = embedding_token_limit()
+        capped = f", capped at the model's {limit}" if chunk_size > limit else ""
+        print(f"✂️ Chunking by model tokens: chunk_size={chunk_size}{capped}, overlap={overlap}")
+    group, group_chunks = [], 0
     for paper in papers:
         title = paper.get("title", "Untitled")
         summary = paper.get("summary", "")
@@ -137,29 +316,154 @@ def process_papers(papers: List[dict], chunk_size: int = 512, overlap: int = 50)
             print(f"⚠️ Skipping empty summary: {title}")
             continue
 
-        chunks = chunk_text(summary, max_length=chunk_size, overlap=overlap)
+        if by_tokens:
+            chunks, chunk_ids = chunk_tokens(summary, max_length=chunk_size, overlap=overlap)
+        else:
+            chunks, chunk_ids = chunk_text(summary, max_length=chunk_size, overlap=overlap), None
         if not chunks:
             print(f"⚠️ No chunks for: {title}")
             continue
 
+        entry = {
+            "title": title,
+            "summary": summary,
+            "chunks": chunks
+        }
+        if chunk_ids is not None:
+            entry["chunk_ids"] = chunk_ids
+        group.append(entry)
+        group_chunks += len(chunks)
+        if group_chunks >= _INGEST_BATCH_CHUNKS:
+            yield group
+            group, group_chunks = [], 0
+
+    if group:
+        yield group
+
+
+def _flatten_chunks(group: List[dict]) -> List[str]:
+    return [chunk for paper in group for chunk in paper["chunks"]]
+
+
+def _embed_group(group: List[dict]):
+    if "chunk_ids" in group[0]:
+        return embed_token_ids([ids for paper in group for ids in paper["chunk_ids"]])
+    return generate_embeddings(_flatten_chunks(group))
+
+
+def _attach_embeddings(group: List[dict], embeddings, processed: List[dict]) -> None:
+    """Splits one group's embeddings back over its papers and appends them to `processed`."""
+    n_chunks = sum(len(paper["chunks"]) for paper in group)
+    if n_chunks != len(embeddings):
+        print(f"⚠️ Mismatch: {n_chunks} chunks vs {len(embeddings)} embeddings; skipping {len(group)} papers")
+        return
+
+    embeddings = l2_normalize(embeddings)
+    start = 0
+    for paper in group:
+        # Token ids were only needed for the forward pass, not in the saved output
+        paper.pop("chunk_ids", None)
+        end = start + len(paper["chunks"])
+        # A (n_chunks, dim) float32 view into the batch matrix, not a list of lists
+        paper["embeddings"] = embeddings[start:end]
+        start = end
+        processed.append(paper)
+        print(f"✅ {paper['title']}: {len(paper['chunks'])} chunks processed")
+
+
+def _report_failure(group: List[dict], error: BaseException) -> None:
+    print(f"❌ Embedding failed for {len(group)} papers ({', '.join(p['title'] for p in group)}): {error}")
+
+
+def _retry_papers(group: List[dict], error: BaseException, processed: List[dict]) -> None:
+    """
+    Re-embeds a failed group one paper at a time, so a transient error or one bad
+    paper costs only the papers that fail again, not the whole ~256-chunk group.
+    """
+    if len(group) == 1:
+        _report_failure(group, error)
+        return
+    print(f"⚠️ Embedding failed for a group of {len(group)} papers ({error}); retrying each paper")
+    for paper in group:
         try:
-            embeddings = generate_embeddings(chunks)
+            embeddings = _embed_group([paper])
         except Exception as e:
-            print(f"❌ Embedding failed for {title}: {e}")
+            _report_failure([paper], e)
             continue
+        _attach_embeddings([paper], embeddings, processed)
 
-        if len(chunks) != len(embeddings):
-            print(
-                f"⚠️ Mismatch: {title} → {len(chunks)} chunks vs {len(embeddings)} embeddings")
+
+async def _aretry_papers(embed, group: List[dict], error: BaseException, processed: List[dict]) -> None:
+    """Async _retry_papers: the group's papers are retried concurrently."""
+    if len(group) == 1:
+        _report_failure(group, error)
+        return
+    print(f"⚠️ Embedding failed for a group of {len(group)} papers ({error}); retrying each paper")
+    results = await asyncio.gather(
+        *[embed(paper["chunks"]) for paper in group],
+        return_exceptions=True
+    )
+    for paper, result in zip(group, results):
+        if isinstance(result, BaseException):
+            _report_failure([paper], result)
             continue
+        _attach_embeddings([paper], result, processed)
 
-        processed.append({
-            "title": title,
-            "summary": summary,
-            "chunks": chunks,
-            "embeddings": embeddings
-        })
-        print(f"✅ {title}: {len(chunks)} chunks processed")
+
+def process_papers(papers: List[dict], chunk_size: int = 512, overlap: int = 50) -> List[dict]:
+    """
+    Chunks and embeds every paper with the configured provider.
+
+    `chunk_size` and `overlap` count whitespace-separated words for remote providers,
+    and the local model's tokens for sentence-transformer (where chunk_size is capped
+    at the model's input length, e.g. 254 for all-MiniLM-L6-v2).
+    """
+    processed = []
+    for group in _group_papers(papers, chunk_size, overlap):
+        try:
+            embeddings = _embed_group(group)
+        except Exception as e:
+            _retry_papers(group, e, processed)
+            continue
+        _attach_embeddings(group, embeddings, processed)
+
+    print(f"📦 Total valid papers: {len(processed)}")
+    return processed
+
+
+async def aprocess_papers(papers: List[dict], chunk_size: int = 512, overlap: int = 50) -> List[dict]:
+    """
+    Async counterpart of process_papers: every paper group is embedded concurrently.
+
+    HTTP providers send the groups' requests concurrently, at most
+    _MAX_CONCURRENT_EMBEDS at a time. This runs under its own asyncio.run (see
+    rebuild_vector_db), so it opens a client with the shared settings rather than
+    reusing the app loop's get_async_http_client().
+    sentence-transformer and bedrock fall back to process_papers in a worker thread,
+    since local inference is already batched and boto3 is blocking.
+    """
+    handler = _ASYNC_EMBEDDERS.get(settings.embedding_provider)
+    if handler is None:
+        return await asyncio.to_thread(process_papers, papers, chunk_size, overlap)
+
+    groups = list(_group_papers(papers, chunk_size, overlap))
+    processed = []
+    semaphore = asyncio.Semaphore(_MAX_CONCURRENT_EMBEDS)
+    async with new_async_http_client() as client:
+        async def embed(chunks: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await handler(client, chunks)
+
+        results = await asyncio.gather(
+            *[embed(_flatten_chunks(group)) for group in groups],
+            return_exceptions=True
+        )
+
+        for group, result in zip(groups, results):
+            if isinstance(result, BaseException):
+                await _aretry_papers(embed, group, result, processed)
+                continue
+            _attach_embeddings(group, result, processed)
 
     print(f"📦 Total valid papers: {len(processed)}")
     return processed
@@ -171,7 +475,8 @@ def run_pipeline(json_dir: str, output_file: str, chunk_size: int = 512, overlap
     print(f"✅ Successfully processed {len(processed)} papers.")
     if processed:
         save_processed_papers_to_file(processed, output_file)
-        print("🔍 Sample output:", json.dumps(processed[0], indent=2)[:1000])
+        sample = orjson.dumps(processed[0], option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2)
+        print("🔍 Sample output:", sample.decode()[:1000])
         print(f"✅ Saved to {output_file}")
     return processed
 
@@ -1,8 +1,10 @@
 from server.src.ingestion.arxiv_client import fetch_papers
 from server.src.ingestion.embeddings import chunk_text, generate_embeddings, process_papers
 from server.src.ingestion.utils import read_json_files
+import numpy as np
 import psycopg2
-from psycopg2.extras import execute_values
+from server.src.config import settings
+from server.src.utils.pg_copy import copy_papers
 from dotenv import load_dotenv
 import os
 
@@ -40,40 +42,30 @@ def insert_papers_to_pgvector(data: list, db_config: dict):
     conn = psycopg2.connect(**db_config)
     cursor = conn.cursor()
 
-    # SQL query to insert a paper's title, summary, chunk, and embedding into the 'papers' table
-    insert_query = """
-    INSERT INTO papers (title, summary, chunk, embedding)
-    VALUES %s
-    """
+    # Generate rows lazily; COPY pulls them as it streams, so no list of every row is built
+    def rows():
+        for entry in data:
+            title = entry["title"]
+            summary = entry["summary"]
+            chunks = entry["chunks"]
+            embeddings = np.asarray(entry["embeddings"], dtype=np.float32)
+
+            # Ensure chunks and embeddings are the same length
+            assert len(chunks) == len(
+                embeddings), "Mismatch between chunks and embeddings length."
+
+            # For each chunk and its corresponding embedding, yield a row for insertion
+            for chunk, embedding in zip(chunks, embeddings):
+                yield title, summary, chunk, embedding
 
-    # Prepare the data for insertion
-    values = []
-    for entry in data:
-        title = entry["title"]
-        summary = entry["summary"]
-        chunks = entry["chunks"]
-        embeddings = entry["embeddings"]
-
-        # Ensure chunks and embeddings are the same length
-        assert len(chunks) == len(
-            embeddings), "Mismatch between chunks and embeddings length."
-
-        # For each chunk and its corresponding embedding, prepare a row for insertion
-        for chunk, embedding in zip(chunks, embeddings):
-            # Prepare each value (embedding should be converted to a list or array-like format for insertion)
-            # If using sentence-transformer, convert to list
-            if hasattr(embedding, "tolist"):
-                embedding = embedding.tolist()
-            values.append((title, summary, chunk, embedding))
-
-    # Use psycopg2's execute_values for efficient bulk insertion
-    execute_values(cursor, insert_query, values)
+    # Binary COPY for efficient bulk insertion (no SQL or vector-literal parsing)
+    inserted = copy_papers(cursor, rows(), settings.embedding_storage)
 
     # Commit the transaction and close the connection
     conn.commit()
     cursor.close()
     conn.close()
-    print(f"✅ Inserted {len(values)} rows into the papers table.")
+    print(f"✅ Inserted {inserted} rows into the papers table.")
 
 # ─────────────────────────────────────────────────────────────
 # 🚀 RUN FULL INGESTION PIPELINE
@@ -116,8 +108,9 @@ def run_pipeline(json_dir: str, chunk_size: int = 512, overlap: int = 50):
 
     Args:
         json_dir (str): Path to JSON files.
-        chunk_size (int): Max tokens per chunk.
-        overlap (int): Overlapping tokens between chunks.
+        chunk_size (int): Max chunk length: model tokens for sentence-transformer
+            (capped at the model's input length), whitespace words otherwise.
+        overlap (int): Overlap between chunks, in the same unit as chunk_size.
     """
     # Step 1: Read JSON files
     papers = read_json_files(json_dir)
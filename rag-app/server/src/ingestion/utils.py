@@ -1,6 +1,6 @@
 from typing import List
 import os 
-import json
+import orjson
 
 def read_json_files(directory: str) -> List[dict]:
     """
@@ -16,18 +16,21 @@ def read_json_files(directory: str) -> List[dict]:
     for filename in os.listdir(directory):
         if filename.endswith(".json"):
             filepath = os.path.join(directory, filename)
-            with open(filepath, "r") as f:
-                papers = json.load(f)
+            with open(filepath, "rb") as f:
+                papers = orjson.loads(f.read())
                 all_data.extend(papers)  # Append to the list of all data
     return all_data
 
 def save_processed_papers_to_file(processed_papers: List[dict], output_file: str):
     """
     Save processed papers (with embeddings) to a JSON file.
+
+    Embeddings may be NumPy arrays: orjson serializes them directly, with no
+    per-row .tolist() into Python floats first.
     
     Args:
         processed_papers (List[dict]): The processed papers with embeddings.
         output_file (str): The file path to save the output JSON.
     """
-    with open(output_file, "w") as f:
-        json.dump(processed_papers, f, indent=4)
+    with open(output_file, "wb") as f:
+        f.write(orjson.dumps(processed_papers, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2))
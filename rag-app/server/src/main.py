@@ -6,34 +6,55 @@ For development purposes this will run on localhost:8000
 """
 
 # server/src/main.py
+import asyncio
 from fastapi import FastAPI, Depends
 from contextlib import asynccontextmanager
-from controllers import retrieval, health_check, generation, ingestion
-from sentence_transformers import SentenceTransformer
-from server.src.config import Settings
+from server.src.controllers import retrieval, health_check, generation, ingestion
+from server.src.services.generation_service import aclose_clients, close_clients, get_openai_client
+from server.src.services.retrieval_service import close_db_pools, get_embedding_model, get_faiss_mirror
+from server.src.config import Settings, settings
 import opik
 
 # Async context manager to load in models I want to keep in memory for the app to use.
 @asynccontextmanager
 async def lifespan_context(app: FastAPI):
     """
-    Lifespan context to manage the embedding model across the app.
+    Lifespan context to warm up the embedding model and LLM clients across the app.
+
+    The services build these lazily through cached getters; warming them here in
+    worker threads, concurrently, makes startup cost max(init) rather than sum(init)
+    and keeps the first request from paying it.
     """
     print("Spinning up lifespan context...")
 
-    print("Configure opik...")
-    opik.configure()
+    if settings.enable_tracing:
+        print("Configure opik...")
+        opik.configure()
+
+    print("Warming up embedding model and LLM clients...")
+    warmups = [asyncio.to_thread(get_embedding_model)]
+    if settings.llm_provider == "openai":
+        warmups.append(asyncio.to_thread(get_openai_client))
+    if settings.vector_backend == "faiss":
+        # An empty papers table (first boot) leaves the mirror unbuilt; search uses pgvector
+        warmups.append(asyncio.to_thread(get_faiss_mirror, {
+            "dbname": settings.postgres_db,
+            "user": settings.postgres_user,
+            "password": settings.postgres_password,
+            "host": settings.postgres_host,
+            "port": settings.postgres_port,
+        }))
+    await asyncio.gather(*warmups)
 
-    # Note below is not actually being passed around the app, needs work!
-    print("Loading embedding model...")
-    embedding_model = SentenceTransformer("all-MiniLM-L6-v2")  # Load the model
     try:
         yield {
-            "embedding_model": embedding_model
+            "embedding_model": get_embedding_model()
         }  # Pass the model as part of the app state
     finally:
-        print("Cleaning up embedding model...")
-        del embedding_model  # Optionally clean up if necessary
+        print("Closing LLM clients and database pools...")
+        close_clients()
+        await aclose_clients()
+        close_db_pools()
 
 
 app = FastAPI(lifespan=lifespan_context)
@@ -1,6 +1,5 @@
 
 """ AWS Refresh Service: Handles temporary STS credential refresh. """
-import boto3
 import time
 from typing import Optional, Dict
 
@@ -10,6 +9,8 @@ class CredentialStore:
 
     @classmethod
     def refresh(cls, duration: int = 3600):
+        import boto3  # only Bedrock users pay for the import
+
         sts = boto3.client("sts")
         response = sts.get_session_token(DurationSeconds=duration)
         creds = response["Credentials"]
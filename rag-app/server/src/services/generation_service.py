@@ -1,199 +1,579 @@
-import json
-import requests
-from typing import List, Dict, Union
-import opik
+import asyncio
+import logging
+import orjson
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
 from server.src.config import settings
+from server.src.services.semantic_cache import cache_response, get_cached_response
 from server.src.utils.bedrock_client_factory import get_bedrock_client
-from openai import OpenAI
-
-# Initialize client placeholders
-openai_client = None
-bedrock_client = None
-azure_endpoint = None
-huggingface_url = None
-cohere_api_key = None
-anthropic_api_key = None
-google_api_key = None
-
-# Initialize actual clients based on provider
-if settings.llm_provider == "openai":
-    openai_client = OpenAI(api_key=settings.openai_api_key)
-elif settings.llm_provider == "bedrock":
-    bedrock_client = get_bedrock_client()
-elif settings.llm_provider == "azure":
-    azure_endpoint = settings.azure_endpoint
-elif settings.llm_provider == "huggingface":
-    huggingface_url = f"https://api-inference.huggingface.co/models/{settings.huggingface_model}"
-elif settings.llm_provider == "cohere":
-    cohere_api_key = settings.cohere_api_key
-elif settings.llm_provider == "anthropic":
-    anthropic_api_key = settings.anthropic_api_key
-elif settings.llm_provider == "google":
-    google_api_key = settings.google_api_key
-
-
-@opik.track
+from server.src.utils.http_client import (
+    DEFAULT_TIMEOUT, CircuitBreaker, aclose_async_http_client, apost, get_async_http_client, get_http_session)
+from server.src.utils.tracing import maybe_track
+
+if TYPE_CHECKING:
+    # The SDK is imported by the client getters, so workers that never call OpenAI skip it
+    from openai import AsyncOpenAI, OpenAI
+
+# Per-request traces go to debug logging: print is synchronous I/O on every call
+logger = logging.getLogger(__name__)
+
+# Static prompt segments, built once at import so each request only splices in
+# the dynamic context and query
+_PROMPT_HEAD = (
+    "You are a helpful AI assistant that provides information based on the "
+    "following context:\n\n"
+)
+_PROMPT_TAIL = (
+    "\n\n"
+    "Please provide a comprehensive answer based on the information in the "
+    "context above. If the context doesn't contain relevant information to "
+    "answer the query, please say so."
+)
+
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> "OpenAI":
+    """
+    Builds the OpenAI client on first use instead of at import, so importing this
+    module stays cheap; the FastAPI lifespan warms it up concurrently at startup.
+    """
+    from openai import OpenAI
+    return OpenAI(api_key=settings.openai_api_key,
+                  timeout=DEFAULT_TIMEOUT[1], max_retries=3)
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """
+    tiktoken encoding for `model`; non-OpenAI models fall back to cl100k_base,
+    which is close enough for budgeting. Returns None if tiktoken (or its BPE
+    files) is unavailable, in which case token counts are estimated.
+    """
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("tiktoken unavailable, estimating tokens: %s", e)
+        return None
+
+
+def _context_token_budget(query: str, max_tokens: int) -> int:
+    """Tokens left for the context once the prompt template, query and reply are reserved."""
+    enc = _get_encoding(settings.openai_model)
+    overhead = _PROMPT_HEAD + "\n\nUser Query: " + query + _PROMPT_TAIL
+    used = len(enc.encode(overhead)) if enc else len(overhead) // 4
+    return max(settings.max_input_tokens - max_tokens - used, 0)
+
+
+def truncate_context(context: str, query: str, max_tokens: int) -> str:
+    """
+    Trims `context` so the full prompt fits in settings.max_input_tokens while
+    leaving room for `max_tokens` of output. Cuts back to the last whole
+    document when one fits, otherwise truncates mid-document.
+    """
+    budget = _context_token_budget(query, max_tokens)
+    enc = _get_encoding(settings.openai_model)
+    if enc is None:
+        if len(context) <= budget * 4:
+            return context
+        truncated = context[:budget * 4]
+    else:
+        ids = enc.encode(context)
+        if len(ids) <= budget:
+            return context
+        truncated = enc.decode(ids[:budget])
+
+    boundary = truncated.rfind("\n\nDocument ")
+    logger.debug("[truncate_context] Context trimmed to %d tokens", budget)
+    return truncated[:boundary + 1] if boundary > 0 else truncated
+
+
+@lru_cache(maxsize=1)
+def get_async_openai_client() -> "AsyncOpenAI":
+    """Async twin of get_openai_client, used by acall_llm."""
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=settings.openai_api_key,
+                       timeout=DEFAULT_TIMEOUT[1], max_retries=3)
+
+
+def close_clients():
+    """Closes any SDK clients created by this module (called on app shutdown)."""
+    if get_openai_client.cache_info().currsize:
+        get_openai_client().close()
+        get_openai_client.cache_clear()
+
+
+async def aclose_clients():
+    """Closes the async SDK and HTTP clients (called on app shutdown)."""
+    if get_async_openai_client.cache_info().currsize:
+        await get_async_openai_client().close()
+        get_async_openai_client.cache_clear()
+    await aclose_async_http_client()
+
+
+# ─────────────────────────────────────────────────────────────
+# 🔌 Provider handlers: (prompt, temperature, max_tokens) -> result
+# ─────────────────────────────────────────────────────────────
+def _call_openai(prompt: str, temp: float, max_t: int) -> Dict[str, Union[str, float, None]]:
+    response = get_openai_client().chat.completions.create(
+        model=settings.openai_model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temp,
+        max_tokens=max_t,
+        top_p=settings.top_p
+    )
+    return {
+        "response": response.choices[0].message.content,
+        "response_tokens_per_second": (
+            (response.usage.total_tokens /
+             response.usage.completion_tokens)
+            if hasattr(response, "usage") else None
+        )
+    }
+
+
+def _bedrock_body(prompt: str, temp: float, max_t: int) -> bytes:
+    return orjson.dumps({
+        "inputText": prompt,  # ✅ Titan expects "inputText"
+        "textGenerationConfig": {  # ✅ Nest under textGenerationConfig
+            "maxTokenCount": max_t,     # ✅ Correct key name for Titan
+            "temperature": temp,
+            "topP": settings.top_p,
+            "stopSequences": []         # ✅ Optional, included for safety
+        }
+    })
+
+
+def _call_bedrock(prompt: str, temp: float, max_t: int) -> Dict[str, Union[str, float, None]]:
+    client = get_bedrock_client()
+    response = client.invoke_model(
+        modelId=settings.bedrock_model_id,
+        body=_bedrock_body(prompt, temp, max_t),
+        contentType="application/json",
+        accept="application/json"
+    )
+
+    result = orjson.loads(response["body"].read())
+    return {
+        "response": result.get("results", [{}])[0].get("outputText", ""),
+        "response_tokens_per_second": None
+    }
+
+
+# HTTP providers are described as (request builder, response parser) pairs so the
+# sync requests path and the async httpx path share one definition per provider.
+_HttpRequest = Tuple[str, Dict[str, str], Dict[str, Any]]
+
+# Bodies are serialised with orjson and sent as bytes, so the content type is set here
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _ollama_request(prompt: str, temp: float, max_t: int) -> _HttpRequest:
+    return (
+        f"{settings.ollama_url}/api/generate",
+        {},
+        {
+            "model": settings.ollama_model,
+            "prompt": prompt,
+            "options": {"temperature": temp, "num_predict": max_t}
+        }
+    )
+
+
+def _ollama_text(result: Any) -> str:
+    return result.get("response", "")
+
+
+def _huggingface_request(prompt: str, temp: float, max_t: int) -> _HttpRequest:
+    return (
+        f"https://api-inference.huggingface.co/models/{settings.huggingface_model}",
+        {"Authorization": f"Bearer {settings.huggingface_api_key}"},
+        {"inputs": prompt}
+    )
+
+
+def _huggingface_text(result: Any) -> str:
+    return result[0]["generated_text"] if isinstance(result, list) else result.get("generated_text", "")
+
+
+def _cohere_request(prompt: str, temp: float, max_t: int) -> _HttpRequest:
+    return (
+        "https://api.cohere.ai/v1/generate",
+        {
+            "Authorization": f"Bearer {settings.cohere_api_key}",
+            "Content-Type": "application/json"
+        },
+        {
+            "model": settings.cohere_model,
+            "prompt": prompt,
+            "max_tokens": max_t,
+            "temperature": temp,
+            "p": settings.top_p
+        }
+    )
+
+
+def _cohere_text(result: Any) -> str:
+    return result.get("text", "")
+
+
+def _anthropic_request(prompt: str, temp: float, max_t: int) -> _HttpRequest:
+    return (
+        "https://api.anthropic.com/v1/complete",
+        {
+            "x-api-key": settings.anthropic_api_key,
+            "Content-Type": "application/json"
+        },
+        {
+            "prompt": prompt,
+            "model": settings.anthropic_model,
+            "max_tokens_to_sample": max_t,
+            "temperature": temp
+        }
+    )
+
+
+def _anthropic_text(result: Any) -> str:
+    return result.get("completion", "")
+
+
+def _azure_request(prompt: str, temp: float, max_t: int) -> _HttpRequest:
+    return (
+        f"{settings.azure_endpoint}/openai/deployments/{settings.azure_deployment_name}/completions?api-version=2023-05-15",
+        {
+            "api-key": settings.azure_openai_api_key,
+            "Content-Type": "application/json"
+        },
+        {
+            "prompt": prompt,
+            "max_tokens": max_t,
+            "temperature": temp,
+            "top_p": settings.top_p
+        }
+    )
+
+
+def _azure_text(result: Any) -> str:
+    return result["choices"][0]["text"]
+
+
+def _google_request(prompt: str, temp: float, max_t: int) -> _HttpRequest:
+    return (
+        f"https://generativelanguage.googleapis.com/v1/models/{settings.google_model}:generateContent?key={settings.google_api_key}",
+        {"Content-Type": "application/json"},
+        {
+            "contents": [
+                {
+                    "parts": [{"text": prompt}]
+                }
+            ],
+            "generationConfig": {
+                "temperature": temp,
+                "topP": settings.top_p,
+                "maxOutputTokens": max_t
+            }
+        }
+    )
+
+
+def _google_text(result: Any) -> str:
+    return result["candidates"][0]["content"]["parts"][0]["text"]
+
+
+_HTTP_PROVIDERS: Dict[str, Tuple[Callable[[str, float, int], _HttpRequest], Callable[[Any], str]]] = {
+    "ollama": (_ollama_request, _ollama_text),
+    "huggingface": (_huggingface_request, _huggingface_text),
+    "cohere": (_cohere_request, _cohere_text),
+    "anthropic": (_anthropic_request, _anthropic_text),
+    "azure": (_azure_request, _azure_text),
+    "google": (_google_request, _google_text),
+}
+
+
+def _call_http(provider: str, prompt: str, temp: float, max_t: int) -> Dict[str, Union[str, float, None]]:
+    build, parse = _HTTP_PROVIDERS[provider]
+    url, headers, body = build(prompt, temp, max_t)
+    response = get_http_session().post(
+        url, headers={**_JSON_HEADERS, **headers}, data=orjson.dumps(body), timeout=DEFAULT_TIMEOUT)
+    # Retries are exhausted by now; a 4xx/5xx must count against the breaker, not parse as an answer
+    response.raise_for_status()
+    return {"response": parse(orjson.loads(response.content)), "response_tokens_per_second": None}
+
+
+# Provider name → handler. Looked up per call (rather than bound once at import)
+# because the /generate endpoint can override settings.llm_provider per request.
+_PROVIDERS: Dict[str, Callable[[str, float, int], Dict[str, Union[str, float, None]]]] = {
+    "openai": _call_openai,
+    "bedrock": _call_bedrock,
+    **{name: partial(_call_http, name) for name in _HTTP_PROVIDERS},
+}
+
+# One breaker per provider: after 5 consecutive failures calls fail fast for 30s.
+# Shared by the sync and async paths, which hit the same upstream.
+_BREAKERS: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(name, fail_max=5, reset_timeout=30.0) for name in _PROVIDERS
+}
+
+
+@maybe_track
 def call_llm(prompt: str, temperature: float = None, max_tokens: int = None) -> Union[Dict[str, Union[str, float, None]], None]:
     temp = temperature or settings.temperature
     max_t = max_tokens or settings.max_tokens
 
     try:
-        if settings.llm_provider == "openai":
-            response = openai_client.chat.completions.create(
-                model=settings.openai_model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=temp,
-                max_tokens=max_t,
-                top_p=settings.top_p
-            )
-            return {
-                "response": response.choices[0].message.content,
-                "response_tokens_per_second": (
-                    (response.usage.total_tokens /
-                     response.usage.completion_tokens)
-                    if hasattr(response, "usage") else None
-                )
-            }
+        handler = _PROVIDERS.get(settings.llm_provider)
+        if handler is None:
+            raise ValueError(
+                f"Unsupported LLM_PROVIDER: {settings.llm_provider}")
+        return _BREAKERS[settings.llm_provider].call(handler, prompt, temp, max_t)
 
-        elif settings.llm_provider == "bedrock":
-            client = get_bedrock_client()
+    except Exception as e:
+        logger.exception("[call_llm] %s call failed", settings.llm_provider)
+        return {"response": f"⚠️ Error: {e}", "response_tokens_per_second": None}
 
-            body = json.dumps({
-                "inputText": prompt,  # ✅ Titan expects "inputText"
-                "textGenerationConfig": {  # ✅ Nest under textGenerationConfig
-                    "maxTokenCount": max_t,     # ✅ Correct key name for Titan
-                    "temperature": temp,
-                    "topP": settings.top_p,
-                    "stopSequences": []         # ✅ Optional, included for safety
-                }
-            })
-
-            response = client.invoke_model(
-                modelId=settings.bedrock_model_id,
-                body=body,
-                contentType="application/json",
-                accept="application/json"
-            )
-
-            result = json.loads(response["body"].read())
-            return {
-                "response": result.get("results", [{}])[0].get("outputText", ""),
-                "response_tokens_per_second": None
-            }
-        elif settings.llm_provider == "ollama":
-            response = requests.post(
-                f"{settings.ollama_url}/api/generate",
-                json={"model": settings.ollama_model, "prompt": prompt}
-            )
-            result = response.json()
-            return {"response": result.get("response", ""), "response_tokens_per_second": None}
-
-        elif settings.llm_provider == "huggingface":
-            headers = {
-                "Authorization": f"Bearer {settings.huggingface_api_key}"}
-            response = requests.post(
-                huggingface_url,
-                headers=headers,
-                json={"inputs": prompt}
-            )
-            result = response.json()
-            return {"response": result[0]["generated_text"] if isinstance(result, list) else result.get("generated_text", ""), "response_tokens_per_second": None}
-
-        elif settings.llm_provider == "cohere":
-            response = requests.post(
-                "https://api.cohere.ai/v1/generate",
-                headers={
-                    "Authorization": f"Bearer {cohere_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": settings.cohere_model,
-                    "prompt": prompt,
-                    "max_tokens": max_t,
-                    "temperature": temp,
-                    "p": settings.top_p
-                }
-            )
-            result = response.json()
-            return {"response": result.get("text", ""), "response_tokens_per_second": None}
-
-        elif settings.llm_provider == "anthropic":
-            response = requests.post(
-                "https://api.anthropic.com/v1/complete",
-                headers={
-                    "x-api-key": anthropic_api_key,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "prompt": prompt,
-                    "model": settings.anthropic_model,
-                    "max_tokens_to_sample": max_t,
-                    "temperature": temp
-                }
-            )
-            result = response.json()
-            return {"response": result.get("completion", ""), "response_tokens_per_second": None}
-
-        elif settings.llm_provider == "azure":
-            response = requests.post(
-                f"{azure_endpoint}/openai/deployments/{settings.azure_deployment_name}/completions?api-version=2023-05-15",
-                headers={
-                    "api-key": settings.azure_openai_api_key,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "prompt": prompt,
-                    "max_tokens": max_t,
-                    "temperature": temp,
-                    "top_p": settings.top_p
-                }
-            )
-            result = response.json()
-            return {"response": result["choices"][0]["text"], "response_tokens_per_second": None}
-
-        elif settings.llm_provider == "google":
-            url = f"https://generativelanguage.googleapis.com/v1/models/{settings.google_model}:generateContent?key={settings.google_api_key}"
-            headers = {"Content-Type": "application/json"}
-            body = {
-                "contents": [
-                    {
-                        "parts": [{"text": prompt}]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": temp,
-                    "topP": settings.top_p,
-                    "maxOutputTokens": max_t
-                }
-            }
 
-            response = requests.post(url, headers=headers, json=body)
-            result = response.json()
-            return {
-                "response": result["candidates"][0]["content"]["parts"][0]["text"],
-                "response_tokens_per_second": None
-            }
+# ─────────────────────────────────────────────────────────────
+# ⚡ Async handlers: same providers, awaited on the event loop
+# ─────────────────────────────────────────────────────────────
+async def _acall_openai(prompt: str, temp: float, max_t: int) -> Dict[str, Union[str, float, None]]:
+    response = await get_async_openai_client().chat.completions.create(
+        model=settings.openai_model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temp,
+        max_tokens=max_t,
+        top_p=settings.top_p
+    )
+    return {
+        "response": response.choices[0].message.content,
+        "response_tokens_per_second": (
+            (response.usage.total_tokens /
+             response.usage.completion_tokens)
+            if hasattr(response, "usage") else None
+        )
+    }
+
+
+async def _acall_bedrock(prompt: str, temp: float, max_t: int) -> Dict[str, Union[str, float, None]]:
+    # boto3 has no async API; its pooled client is thread-safe, so borrow a worker thread
+    return await asyncio.to_thread(_call_bedrock, prompt, temp, max_t)
 
-        else:
+
+async def _acall_http(provider: str, prompt: str, temp: float, max_t: int) -> Dict[str, Union[str, float, None]]:
+    build, parse = _HTTP_PROVIDERS[provider]
+    url, headers, body = build(prompt, temp, max_t)
+    response = await apost(
+        get_async_http_client(), url, headers={**_JSON_HEADERS, **headers}, content=orjson.dumps(body))
+    response.raise_for_status()
+    return {"response": parse(orjson.loads(response.content)), "response_tokens_per_second": None}
+
+
+_ASYNC_PROVIDERS: Dict[str, Callable[[str, float, int], Awaitable[Dict[str, Union[str, float, None]]]]] = {
+    "openai": _acall_openai,
+    "bedrock": _acall_bedrock,
+    **{name: partial(_acall_http, name) for name in _HTTP_PROVIDERS},
+}
+
+
+@maybe_track
+async def acall_llm(prompt: str, temperature: float = None, max_tokens: int = None) -> Union[Dict[str, Union[str, float, None]], None]:
+    """Async counterpart of call_llm; many concurrent requests share one event loop."""
+    temp = temperature or settings.temperature
+    max_t = max_tokens or settings.max_tokens
+
+    try:
+        handler = _ASYNC_PROVIDERS.get(settings.llm_provider)
+        if handler is None:
             raise ValueError(
                 f"Unsupported LLM_PROVIDER: {settings.llm_provider}")
+        return await _BREAKERS[settings.llm_provider].acall(handler, prompt, temp, max_t)
 
     except Exception as e:
-        print(f"[call_llm] Error: {e}")
+        logger.exception("[acall_llm] %s call failed", settings.llm_provider)
         return {"response": f"⚠️ Error: {e}", "response_tokens_per_second": None}
 
 
-@opik.track
+# ─────────────────────────────────────────────────────────────
+# 📡 Streaming handlers: (prompt, temperature, max_tokens) -> text deltas
+# ─────────────────────────────────────────────────────────────
+def _stream_openai(prompt: str, temp: float, max_t: int) -> Iterator[str]:
+    stream = get_openai_client().chat.completions.create(
+        model=settings.openai_model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temp,
+        max_tokens=max_t,
+        top_p=settings.top_p,
+        stream=True
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def _stream_bedrock(prompt: str, temp: float, max_t: int) -> Iterator[str]:
+    client = get_bedrock_client()
+    response = client.invoke_model_with_response_stream(
+        modelId=settings.bedrock_model_id,
+        body=_bedrock_body(prompt, temp, max_t),
+        contentType="application/json",
+        accept="application/json"
+    )
+    for event in response["body"]:
+        chunk = event.get("chunk")
+        if chunk:
+            text = orjson.loads(chunk["bytes"]).get("outputText", "")
+            if text:
+                yield text
+
+
+def _stream_anthropic(prompt: str, temp: float, max_t: int) -> Iterator[str]:
+    with get_http_session().post(
+        "https://api.anthropic.com/v1/complete",
+        headers={
+            "x-api-key": settings.anthropic_api_key,
+            "Content-Type": "application/json"
+        },
+        json={
+            "prompt": prompt,
+            "model": settings.anthropic_model,
+            "max_tokens_to_sample": max_t,
+            "temperature": temp,
+            "stream": True
+        },
+        stream=True,
+        timeout=DEFAULT_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        # SSE: "event:" lines name the payload on the following "data:" line. Text
+        # Completions sends "completion" events (the last one has a stop_reason),
+        # "ping" keep-alives, and an "error" event if generation fails mid-stream
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            try:
+                event = orjson.loads(data)
+            except orjson.JSONDecodeError:
+                continue
+            if not isinstance(event, dict):
+                continue
+            if event.get("type") == "error":
+                raise RuntimeError(f"Anthropic stream error: {event.get('error')}")
+            text = event.get("completion", "")
+            if text:
+                yield text
+            if event.get("stop_reason"):
+                return
+
+
+def _stream_ollama(prompt: str, temp: float, max_t: int) -> Iterator[str]:
+    # Ollama streams newline-delimited JSON objects by default
+    url, _, body = _ollama_request(prompt, temp, max_t)
+    with get_http_session().post(url, json=body, stream=True, timeout=DEFAULT_TIMEOUT) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = orjson.loads(line)
+            if "error" in event:
+                raise RuntimeError(f"Ollama stream error: {event['error']}")
+            text = event.get("response", "")
+            if text:
+                yield text
+            if event.get("done"):
+                return
+
+
+_STREAM_PROVIDERS: Dict[str, Callable[[str, float, int], Iterator[str]]] = {
+    "openai": _stream_openai,
+    "bedrock": _stream_bedrock,
+    "anthropic": _stream_anthropic,
+    "ollama": _stream_ollama,
+}
+
+
+def call_llm_stream(prompt: str, temperature: float = None, max_tokens: int = None) -> Iterator[str]:
+    """
+    Streams the completion for `prompt` token-by-token from the configured provider.
+
+    Providers with a native streaming API (OpenAI, Bedrock, Anthropic, Ollama) yield
+    text deltas as soon as they arrive; the rest fall back to a single chunk holding
+    the full `call_llm` response.
+    """
+    temp = temperature or settings.temperature
+    max_t = max_tokens or settings.max_tokens
+
+    try:
+        handler = _STREAM_PROVIDERS.get(settings.llm_provider)
+        if handler is None:
+            yield call_llm(prompt, temperature=temp, max_tokens=max_t)["response"]
+            return
+        yield from _BREAKERS[settings.llm_provider].stream(handler, prompt, temp, max_t)
+
+    except Exception as e:
+        logger.exception("[call_llm_stream] %s call failed", settings.llm_provider)
+        yield f"⚠️ Error: {e}"
+
+
+def _semantic_cache_get(query, chunks, max_tokens, temperature, query_embedding) -> Optional[Dict]:
+    if not settings.semantic_cache_enabled:
+        return None
+    cached = get_cached_response(query, chunks, max_tokens, temperature, query_embedding)
+    if cached is not None:
+        logger.debug("[generate_response] Semantic cache hit")
+    return cached
+
+
+def _semantic_cache_put(query, chunks, max_tokens, temperature, result, query_embedding) -> None:
+    if settings.semantic_cache_enabled:
+        cache_response(query, chunks, max_tokens, temperature, result, query_embedding)
+
+
+# Chunk lists are large and already traced by retrieval, so skip input capture
+@maybe_track(capture_input=False)
 def generate_response(
     query: str,
     chunks: List[Dict],
     max_tokens: int = 200,
     temperature: float = 0.7,
+    query_embedding: Optional[np.ndarray] = None,
 ) -> Dict:
-    context = format_context_from_chunks(chunks)
-    prompt = create_prompt_with_context(query, context)
-    print(f"[generate_response] Provider: {settings.llm_provider}")
-    result = call_llm(prompt, temperature=temperature, max_tokens=max_tokens)
+    context = truncate_context(format_context_from_chunks(chunks), query, max_tokens)
+    result = _semantic_cache_get(query, chunks, max_tokens, temperature, query_embedding)
+    if result is None:
+        prompt = create_prompt_with_context(query, context)
+        logger.debug("[generate_response] Provider: %s", settings.llm_provider)
+        result = call_llm(prompt, temperature=temperature, max_tokens=max_tokens)
+        _semantic_cache_put(query, chunks, max_tokens, temperature, result, query_embedding)
+    return {
+        "query": query,
+        "context": context,
+        "response": result["response"],
+        "response_tokens_per_second": result.get("response_tokens_per_second")
+    }
+
+
+@maybe_track(capture_input=False)
+async def agenerate_response(
+    query: str,
+    chunks: List[Dict],
+    max_tokens: int = 200,
+    temperature: float = 0.7,
+    query_embedding: Optional[np.ndarray] = None,
+) -> Dict:
+    """Async counterpart of generate_response for use from async endpoints."""
+    context = truncate_context(format_context_from_chunks(chunks), query, max_tokens)
+    result = _semantic_cache_get(query, chunks, max_tokens, temperature, query_embedding)
+    if result is None:
+        prompt = create_prompt_with_context(query, context)
+        logger.debug("[agenerate_response] Provider: %s", settings.llm_provider)
+        result = await acall_llm(prompt, temperature=temperature, max_tokens=max_tokens)
+        _semantic_cache_put(query, chunks, max_tokens, temperature, result, query_embedding)
     return {
         "query": query,
         "context": context,
@@ -202,26 +582,44 @@ def generate_response(
     }
 
 
+def generate_response_stream(
+    query: str,
+    chunks: List[Dict],
+    max_tokens: int = 200,
+    temperature: float = 0.7,
+    query_embedding: Optional[np.ndarray] = None,
+) -> Iterator[str]:
+    """
+    Streaming counterpart of generate_response. A semantic cache hit is sent as one
+    chunk; a completed stream is cached as the joined text.
+    """
+    cached = _semantic_cache_get(query, chunks, max_tokens, temperature, query_embedding)
+    if cached is not None:
+        yield cached["response"]
+        return
+
+    context = truncate_context(format_context_from_chunks(chunks), query, max_tokens)
+    prompt = create_prompt_with_context(query, context)
+    logger.debug("[generate_response_stream] Provider: %s", settings.llm_provider)
+    tokens = []
+    for token in call_llm_stream(prompt, temperature=temperature, max_tokens=max_tokens):
+        tokens.append(token)
+        yield token
+    # call_llm_stream ends on an error placeholder when the provider fails mid-stream
+    if tokens and not tokens[-1].startswith("⚠️ Error"):
+        _semantic_cache_put(query, chunks, max_tokens, temperature,
+                            {"response": "".join(tokens)}, query_embedding)
+
+
 def format_context_from_chunks(chunks: List[Dict]) -> str:
     if not chunks:
         return "No relevant context available."
 
-    formatted_chunks = []
-    for i, chunk in enumerate(chunks, 1):
-        title = chunk.get("title", "Untitled")
-        content = chunk.get("chunk", "")
-        formatted_chunks.append(f"Document {i} - {title}:\n{content}\n")
-
-    return "\n".join(formatted_chunks)
+    return "\n".join(
+        f"Document {i} - {chunk.get('title', 'Untitled')}:\n{chunk.get('chunk', '')}\n"
+        for i, chunk in enumerate(chunks, 1)
+    )
 
 
 def create_prompt_with_context(query: str, context: str) -> str:
-    return (
-        "You are a helpful AI assistant that provides information based on the "
-        "following context:\n\n"
-        f"{context}\n\n"
-        f"User Query: {query}\n\n"
-        "Please provide a comprehensive answer based on the information in the "
-        "context above. If the context doesn't contain relevant information to "
-        "answer the query, please say so."
-    )
+    return _PROMPT_HEAD + context + "\n\nUser Query: " + query + _PROMPT_TAIL
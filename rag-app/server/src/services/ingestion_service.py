@@ -1,65 +1,129 @@
+import asyncio
 import os
 import json
-import requests
-from typing import Optional
+import orjson
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
 import psycopg2
-from psycopg2.extras import execute_values
 
 from server.src.config import settings
 from server.src.utils.bedrock_client_factory import get_bedrock_client
-from server.src.ingestion.embeddings import process_papers
+from server.src.utils.http_client import DEFAULT_TIMEOUT, get_http_session
+from server.src.utils.pg_copy import copy_papers
+from server.src.ingestion.embeddings import aprocess_papers
 from server.src.ingestion.utils import read_json_files, save_processed_papers_to_file
-import opik
+from server.src.utils.tracing import maybe_track
 
 # ─────────────────────────────────────────────────────────────
 # 🧠 Detect vector dimension for given embedding provider
 # ─────────────────────────────────────────────────────────────
 
+# Dimensions are fixed per (provider, model), so well-known models never need a probe
+_KNOWN_EMBEDDING_DIMS: Dict[str, int] = {
+    "sentence-transformer:all-MiniLM-L6-v2": 384,
+    "openai:text-embedding-3-small": 1536,
+    "openai:text-embedding-3-large": 3072,
+    "openai:text-embedding-ada-002": 1536,
+    "bedrock:amazon.titan-embed-text-v1": 1536,
+    "bedrock:amazon.titan-embed-text-v2:0": 1024,
+    "huggingface:sentence-transformers/all-MiniLM-L6-v2": 384,
+    "google:text-embedding-004": 768,
+    "google:models/text-embedding-004": 768,
+}
+
+# Probed dimensions are persisted here so later processes skip the network round-trip
+_DIM_CACHE_PATH = Path("~/.cache/rag/embedding_dims.json").expanduser()
+_dim_cache: Dict[str, int] = {}
+
+
+def _embedding_model_name(provider: str) -> str:
+    return {
+        "sentence-transformer": "all-MiniLM-L6-v2",
+        "openai": settings.openai_embedding_model,
+        "bedrock": settings.bedrock_embedding_model_id,
+        "huggingface": getattr(settings, "huggingface_model", None),
+        "google": getattr(settings, "google_embedding_model", None),
+    }.get(provider) or "default"
+
+
+def _load_dim_cache() -> Dict[str, int]:
+    try:
+        with open(_DIM_CACHE_PATH, "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_dim_cache(cache: Dict[str, int]):
+    try:
+        _DIM_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(_DIM_CACHE_PATH, "w") as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"⚠️ Could not persist embedding dimension cache: {e}")
+
 
 def detect_embedding_dim(example_text: str = "test", override_provider: Optional[str] = None) -> int:
     provider = override_provider or settings.embedding_provider
     print(f"⚙️ Embedding provider → {provider}")
 
+    key = f"{provider}:{_embedding_model_name(provider)}"
+    if key in _KNOWN_EMBEDDING_DIMS:
+        return _KNOWN_EMBEDDING_DIMS[key]
+
+    if not _dim_cache:
+        _dim_cache.update(_load_dim_cache())
+    if key not in _dim_cache:
+        _dim_cache[key] = _probe_embedding_dim(provider, example_text)
+        _save_dim_cache(_dim_cache)
+    return _dim_cache[key]
+
+
+def _probe_embedding_dim(provider: str, example_text: str) -> int:
     if provider == "bedrock":
         client = get_bedrock_client()
         response = client.invoke_model(
             modelId=settings.bedrock_embedding_model_id,
-            body=json.dumps({"inputText": example_text}),
+            body=orjson.dumps({"inputText": example_text}),
             contentType="application/json",
             accept="application/json"
         )
-        return len(json.loads(response["body"].read())["embedding"])
+        return len(orjson.loads(response["body"].read())["embedding"])
 
     elif provider == "openai":
         headers = {
             "Authorization": f"Bearer {settings.openai_api_key}",
             "Content-Type": "application/json"
         }
-        response = requests.post(
+        response = get_http_session().post(
             "https://api.openai.com/v1/embeddings",
             headers=headers,
-            json={"input": example_text, "model": settings.openai_embedding_model}
+            json={"input": example_text, "model": settings.openai_embedding_model},
+            timeout=DEFAULT_TIMEOUT
         )
-        return len(response.json()["data"][0]["embedding"])
+        return len(orjson.loads(response.content)["data"][0]["embedding"])
 
     elif provider == "huggingface":
         headers = {"Authorization": f"Bearer {settings.huggingface_api_key}"}
-        response = requests.post(
+        response = get_http_session().post(
             f"https://api-inference.huggingface.co/pipeline/feature-extraction/{settings.huggingface_model}",
             headers=headers,
-            json={"inputs": example_text}
+            json={"inputs": example_text},
+            timeout=DEFAULT_TIMEOUT
         )
-        result = response.json()
+        result = orjson.loads(response.content)
         return len(result[0]) if isinstance(result, list) else len(result)
 
     elif provider == "cohere":
         headers = {"Authorization": f"Bearer {settings.cohere_api_key}"}
-        response = requests.post(
+        response = get_http_session().post(
             "https://api.cohere.ai/v1/embed",
             headers=headers,
-            json={"texts": [example_text]}
+            json={"texts": [example_text]},
+            timeout=DEFAULT_TIMEOUT
         )
-        return len(response.json()["embeddings"][0])
+        return len(orjson.loads(response.content)["embeddings"][0])
 
     elif provider == "google":
         url = f"https://generativelanguage.googleapis.com/v1/models/{settings.google_embedding_model}:embedContent?key={settings.google_api_key}"
@@ -69,8 +133,8 @@ def detect_embedding_dim(example_text: str = "test", override_provider: Optional
                 "parts": [{"text": example_text}]
             }
         }
-        response = requests.post(url, headers=headers, json=body)
-        result = response.json()
+        response = get_http_session().post(url, headers=headers, json=body, timeout=DEFAULT_TIMEOUT)
+        result = orjson.loads(response.content)
 
         if "embedding" not in result or "values" not in result["embedding"]:
             print("❌ Google embedding error: full response =",
@@ -85,9 +149,43 @@ def detect_embedding_dim(example_text: str = "test", override_provider: Optional
 # ─────────────────────────────────────────────────────────────
 # 📐 Write init_pgvector.sql for Postgres vector setup
 # ─────────────────────────────────────────────────────────────
+# Approximate-nearest-neighbour index for the inner-product `<#>` search in retrieval
+# (pgvector >= 0.5). Built after the bulk load, which is much faster than indexing row by row.
+# `{storage}` is settings.embedding_storage: "vector" (fp32) or "halfvec" (fp16).
+_HNSW_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS papers_embedding_hnsw
+    ON papers USING hnsw (embedding {storage}_ip_ops)
+    WITH (m = 16, ef_construction = 64);
+"""
+
+# IVFFlat trains its list centroids on the rows present, so it must be built after the load.
+# Builds far faster and smaller than HNSW; recall is tuned at query time via ivfflat.probes.
+_IVFFLAT_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS papers_embedding_ivfflat
+    ON papers USING ivfflat (embedding {storage}_ip_ops)
+    WITH (lists = 100);
+"""
+
+
+def _ann_index_sql(storage: str) -> str:
+    template = _IVFFLAT_INDEX_SQL if settings.vector_index == "ivfflat" else _HNSW_INDEX_SQL
+    return template.format(storage=storage)
+
+# Lets the planner fan residual sequential scans (e.g. unindexed filters) out over workers
+_PARALLEL_SCAN_SQL = """
+ALTER TABLE papers SET (parallel_workers = 4);
+"""
+
+
 def write_pgvector_sql(dim: int, output_file: str = "init/init_pgvector.sql"):
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    storage = settings.embedding_storage
+    # This script creates an empty table: IVFFlat would train its lists on zero rows,
+    # so that index is left to rebuild_vector_db, after the load
+    index_sql = "" if settings.vector_index == "ivfflat" else _ann_index_sql(storage)
     sql = f"""
+-- Parallel workers per gather are a server setting (postgres -c max_parallel_workers_per_gather,
+-- see deploy/docker/docker-compose.yaml); only the per-table hint belongs here.
 CREATE EXTENSION IF NOT EXISTS vector;
 
 DROP TABLE IF EXISTS papers;
@@ -97,9 +195,9 @@ CREATE TABLE IF NOT EXISTS papers (
     title TEXT NOT NULL,
     summary TEXT NOT NULL,
     chunk TEXT NOT NULL,
-    embedding vector({dim})
+    embedding {storage}({dim})
 );
-"""
+{index_sql}{_PARALLEL_SCAN_SQL}"""
     with open(output_file, "w") as f:
         f.write(sql)
     print(f"✅ Wrote init_pgvector.sql with dimension {dim}")
@@ -108,13 +206,25 @@ CREATE TABLE IF NOT EXISTS papers (
 # ─────────────────────────────────────────────────────────────
 # 🔁 End-to-end ingestion & vector DB rebuild
 # ─────────────────────────────────────────────────────────────
-@opik.track
+def _iter_rows(processed: List[dict]) -> Iterator[Tuple[str, str, str, np.ndarray]]:
+    """Yields one (title, summary, chunk, embedding) row per chunk of each processed paper."""
+    for entry in processed:
+        # (a)process_papers emits (n_chunks, dim) float32 arrays; an fp64 copy here would
+        # double the bytes of every row before COPY narrows it again
+        embeddings = entry["embeddings"]
+        assert embeddings.dtype == np.float32, f"expected float32 embeddings, got {embeddings.dtype}"
+        for chunk, embedding in zip(entry["chunks"], embeddings):
+            yield entry["title"], entry["summary"], chunk, embedding
+
+
+@maybe_track
 def rebuild_vector_db(
     json_dir: str,
     output_file: Optional[str] = None,
     chunk_size: int = 512,
     overlap: int = 50
-):
+) -> int:
+    """Re-embeds every paper into a fresh papers table; returns the embedding dimension."""
     print(f"📂 Rebuilding vector DB from: {json_dir}")
     dim = detect_embedding_dim(override_provider=settings.embedding_provider)
     write_pgvector_sql(dim)
@@ -122,7 +232,8 @@ def rebuild_vector_db(
     try:
         papers = read_json_files(json_dir)
         print(f"📄 Papers loaded: {len(papers)}")
-        processed = process_papers(papers, chunk_size, overlap)
+        # Paper groups embed concurrently; this runs in FastAPI's threadpool, so no loop is active
+        processed = asyncio.run(aprocess_papers(papers, chunk_size, overlap))
         print(f"✂️ Processed papers: {len(processed)}")
 
         db_config = {
@@ -136,6 +247,9 @@ def rebuild_vector_db(
         conn = psycopg2.connect(**db_config)
         cursor = conn.cursor()
 
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+
+        storage = settings.embedding_storage
         cursor.execute("DROP TABLE IF EXISTS papers;")
         cursor.execute(f"""
             CREATE TABLE papers (
@@ -143,39 +257,27 @@ def rebuild_vector_db(
                 title TEXT NOT NULL,
                 summary TEXT NOT NULL,
                 chunk TEXT NOT NULL,
-                embedding vector({dim})
+                embedding {storage}({dim})
             );
         """)
-        print(f"🧱 Recreated 'papers' table with vector({dim})")
-
-        insert_query = """
-        INSERT INTO papers (title, summary, chunk, embedding)
-        VALUES %s
-        """
-
-        values = []
-        for entry in processed:
-            for chunk, embedding in zip(entry["chunks"], entry["embeddings"]):
-                if hasattr(embedding, "tolist"):
-                    embedding = embedding.tolist()
-                values.append(
-                    (entry["title"], entry["summary"], chunk, embedding))
-
-        execute_values(cursor, insert_query, values)
+        print(f"🧱 Recreated 'papers' table with {storage}({dim})")
+
+        # Binary COPY: no SQL or vector-literal parsing on the server. Rows are
+        # generated as COPY consumes them rather than collected into a list first.
+        inserted = copy_papers(cursor, _iter_rows(processed), storage)
+        cursor.execute(_ann_index_sql(storage))
+        cursor.execute(_PARALLEL_SCAN_SQL)
         conn.commit()
         cursor.close()
         conn.close()
-        print(f"✅ Inserted {len(values)} rows into the papers table.")
+        print(f"✅ Inserted {inserted} rows into the papers table.")
 
         if output_file:
-            for entry in processed:
-                entry["embeddings"] = [
-                    emb.tolist() if hasattr(emb, "tolist") else emb
-                    for emb in entry["embeddings"]
-                ]
             save_processed_papers_to_file(processed, output_file)
             print(f"💾 Saved processed papers to: {output_file}")
 
+        return dim
+
     except Exception as e:
         print(f"❌ Ingestion failed: {e}")
         raise
@@ -1,10 +1,45 @@
-from server.src.services.generation_service import call_llm
-from typing import Union, Dict
+from server.src.services.generation_service import call_llm, format_context_from_chunks, truncate_context
+from typing import Union, Dict, List
+import re
 import opik
+import orjson
 from server.src.config import settings
+from server.src.utils.tracing import maybe_track
 
+_EXPAND_TMPL = """
+    Expand the following query using synonyms and related phrases.
+    Make it more expressive to improve semantic retrieval performance.
+
+    Query: {}
+    Expanded Query:
+    """
+
+# Expansion and answer in one completion, so the pipeline pays one LLM round-trip
+_EXPAND_AND_ANSWER_TMPL = """
+    You are a helpful AI assistant that provides information based on the following context:
+
+    {context}
+
+    Step 1: Expand the user query using synonyms and related phrases.
+    Step 2: Using the context above, answer the expanded query comprehensively.
+    If the context doesn't contain relevant information to answer the query, please say so.
+
+    Respond with a single JSON object and nothing else:
+    {{"expanded_query": "<expanded query>", "answer": "<answer>"}}
+
+    User Query: {query}
+    """
 
-@opik.track
+# Output tokens reserved for the JSON envelope and expanded query, on top of the
+# caller's max_tokens for the answer itself
+_EXPANSION_TOKENS = 100
+
+_ANSWER_START = re.compile(r'"answer"\s*:\s*"')
+# The body of a JSON string: anything but an unescaped quote
+_JSON_STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*', re.S)
+
+
+@maybe_track
 def expand_query(query: str) -> Union[Dict[str, str], None]:
     """
     Expands a user query using the configured LLM provider.
@@ -19,13 +54,7 @@ def expand_query(query: str) -> Union[Dict[str, str], None]:
     """
 
     # Construct the prompt
-    prompt = f"""
-    Expand the following query using synonyms and related phrases.
-    Make it more expressive to improve semantic retrieval performance.
-
-    Query: {query}
-    Expanded Query:
-    """
+    prompt = _EXPAND_TMPL.format(query)
 
     # Call the LLM backend (OpenAI, Bedrock, etc.)
     result = call_llm(prompt)
@@ -33,23 +62,113 @@ def expand_query(query: str) -> Union[Dict[str, str], None]:
     if result and "response" in result:
         expanded = result["response"].strip().replace('"', "")
         provider = settings.llm_provider
+        prompt_used = prompt.strip()
 
         # ✅ Send metadata to Opik as trace tags
-        opik.set_tags({
-            "llm_provider": provider,
-            "query.original": query,
-            "query.expanded": expanded,
-            "query.prompt_used": prompt.strip()
-        })
+        if settings.enable_tracing:
+            opik.set_tags({
+                "llm_provider": provider,
+                "query.original": query,
+                "query.expanded": expanded,
+                "query.prompt_used": prompt_used
+            })
 
         return {
             "original_query": query,
             "expanded_query": expanded,
             "provider": provider,
-            "prompt": prompt.strip()
+            "prompt": prompt_used
         }
 
     # On failure
-    opik.set_tags({"expansion_status": "failed",
-                  "llm_provider": settings.llm_provider})
+    if settings.enable_tracing:
+        opik.set_tags({"expansion_status": "failed",
+                      "llm_provider": settings.llm_provider})
     return None
+
+
+def _json_string_prefix(text: str) -> str:
+    """Decodes the start of a JSON string body, up to its closing quote or the end of `text`."""
+    body = _JSON_STRING_BODY.match(text).group(0)
+    try:
+        return orjson.loads(f'"{body}"')
+    except orjson.JSONDecodeError:
+        # Raw control characters or a half-written \u escape: keep the text as written
+        return body.replace('\\n', "\n").replace('\\"', '"')
+
+
+def _parse_expand_and_answer(text: str, query: str) -> Dict[str, str]:
+    """
+    Pulls the JSON object out of the model output. Models often wrap it in prose or
+    code fences, so parse the outermost {...}. An object cut off by max_tokens keeps
+    whatever was written of the answer; output with no object at all is taken as
+    the answer.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1:
+        return {"expanded_query": query, "answer": text.strip()}
+
+    if end > start:
+        try:
+            parsed = orjson.loads(text[start:end + 1])
+            if isinstance(parsed, dict) and "answer" in parsed:
+                return {
+                    "expanded_query": str(parsed.get("expanded_query") or query).strip(),
+                    "answer": str(parsed["answer"]).strip()
+                }
+        except orjson.JSONDecodeError:
+            pass
+
+    # Unterminated or malformed object: never hand the raw envelope back as the answer
+    answer = _ANSWER_START.search(text, start)
+    if answer is None:
+        return {
+            "expanded_query": query,
+            "answer": "⚠️ Error: the reply was cut off before the answer; retry with a larger max_tokens"
+        }
+    expanded = re.search(r'"expanded_query"\s*:\s*"', text[start:answer.start()])
+    return {
+        "expanded_query": (_json_string_prefix(text[start + expanded.end():]).strip()
+                           if expanded else query) or query,
+        "answer": _json_string_prefix(text[answer.end():]).strip()
+    }
+
+
+@maybe_track(capture_input=False)
+def expand_and_generate(
+    query: str,
+    chunks: List[Dict],
+    max_tokens: int = 200,
+    temperature: float = 0.7,
+) -> Dict:
+    """
+    Expands the query and answers it from the retrieved chunks in a single LLM call,
+    instead of the two sequential calls of expand_query + generate_response.
+    `max_tokens` budgets the answer; the JSON envelope gets _EXPANSION_TOKENS more.
+
+    Returns:
+        dict with the generate_response keys (query, context, response,
+        response_tokens_per_second) plus expanded_query and provider
+    """
+    output_tokens = max_tokens + _EXPANSION_TOKENS
+    context = truncate_context(format_context_from_chunks(chunks), query, output_tokens)
+    prompt = _EXPAND_AND_ANSWER_TMPL.format(context=context, query=query)
+
+    result = call_llm(prompt, temperature=temperature, max_tokens=output_tokens)
+    parsed = _parse_expand_and_answer(result["response"], query)
+
+    if settings.enable_tracing:
+        opik.set_tags({
+            "llm_provider": settings.llm_provider,
+            "query.original": query,
+            "query.expanded": parsed["expanded_query"]
+        })
+
+    return {
+        "query": query,
+        "expanded_query": parsed["expanded_query"],
+        "context": context,
+        "response": parsed["answer"],
+        "response_tokens_per_second": result.get("response_tokens_per_second"),
+        "provider": settings.llm_provider
+    }
@@ -2,29 +2,453 @@
 
 This will perform naive rag retrieval for a given query using cosine similarity and top_k retrieval
 """
-import psycopg2
-from typing import List, Dict
-from sentence_transformers import SentenceTransformer
-import opik
+import hashlib
+import logging
+import threading
+import numpy as np
+from cachetools import TTLCache
+from collections import Counter
+from functools import lru_cache
+from psycopg2.extensions import connection as PGConnection
+from psycopg2.pool import ThreadedConnectionPool
+from pgvector.psycopg2 import register_vector
+from typing import Any, List, Dict, Optional, Tuple
+from server.src.config import settings
+from server.src.utils.faiss_index import FaissMirror
+from server.src.utils.micro_batcher import MicroBatcher
+from server.src.utils.onnx_encoder import OnnxSentenceEncoder
+from server.src.utils.tracing import maybe_track
 
-# Load a pre-trained Sentence Transformer model (e.g., 'all-MiniLM-L6-v2') - ideally retrieve this from app state ...
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+try:
+    # SIMD tree hashing; several times faster than SHA-256 on long prompts
+    from blake3 import blake3 as _hasher
+except ImportError:
+    # hashlib's SHA-256 already uses SHA-NI where the CPU has it
+    _hasher = hashlib.sha256
+
+logger = logging.getLogger(__name__)
+
+
+def _detect_device() -> str:
+    """Picks the fastest available torch device: CUDA, then Apple MPS, then CPU."""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return "cuda"
+        if torch.backends.mps.is_available():
+            return "mps"
+    except Exception:
+        pass
+    return "cpu"
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model():
+    """
+    Returns the query embedding model, loaded once per process.
+
+    Uses the int8 ONNX Runtime export when EMBEDDING_ONNX_PATH is set, otherwise
+    the PyTorch 'all-MiniLM-L6-v2' Sentence Transformer on the best available
+    device. Both expose `.encode`.
+    """
+    if settings.embedding_onnx_path:
+        return OnnxSentenceEncoder(settings.embedding_onnx_path)
+
+    # Imported here so torch is only loaded when the model is actually built
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer("all-MiniLM-L6-v2", device=_detect_device())
+
+
+async def embed_queries_async(queries: List[str]) -> np.ndarray:
+    """
+    Embeds a batch with the configured provider without blocking the event loop;
+    remote providers are called concurrently. Returns unit-length float32 rows.
+    """
+    # Imported here: the ingestion module itself imports this one
+    from server.src.ingestion.embeddings import generate_embeddings_async, l2_normalize
+    return l2_normalize(await generate_embeddings_async(queries))
+
+
+def embed_queries(queries: List[str], batch_size: int = 64) -> np.ndarray:
+    """
+    Embeds many texts in one batched pass of the cached model.
+
+    Inputs are sorted by length first so each batch pads to similar lengths, then
+    the rows are put back in input order.
+
+    Args:
+        queries (List[str]): Texts to embed.
+        batch_size (int): Texts per forward pass.
+
+    Returns:
+        np.ndarray: (len(queries), dim) float32, unit-length rows.
+    """
+    if not queries:
+        return np.empty((0, 0), dtype=np.float32)
+
+    order = sorted(range(len(queries)), key=lambda i: len(queries[i]))
+    encoded = np.asarray(get_embedding_model().encode(
+        [queries[i] for i in order],
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+    ), dtype=np.float32)
+
+    embeddings = np.empty_like(encoded)
+    embeddings[order] = encoded
+    return embeddings
+
+
+def embedding_token_limit() -> int:
+    """The most content tokens (special tokens excluded) the local model embeds in one pass."""
+    model = get_embedding_model()
+    max_length = getattr(model, "max_seq_length", None) or model.tokenizer.model_max_length
+    return max_length - model.tokenizer.num_special_tokens_to_add()
+
+
+def tokenize_for_embedding(text: str) -> Tuple[List[int], List[Tuple[int, int]], int]:
+    """
+    Tokenizes `text` with the local embedding model's own tokenizer.
+
+    Returns:
+        Tuple: token ids (no special tokens), each token's (start, end) character
+        offsets in `text`, and embedding_token_limit().
+    """
+    encoded = get_embedding_model().tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    return encoded["input_ids"], encoded["offset_mapping"], embedding_token_limit()
+
+
+def embed_token_ids(token_ids: List[List[int]], batch_size: int = 64) -> np.ndarray:
+    """
+    embed_queries for pre-tokenized texts (from tokenize_for_embedding): the ids go
+    straight into the forward pass, so ingestion never tokenizes a chunk twice.
+
+    Returns:
+        np.ndarray: (len(token_ids), dim) float32, unit-length rows.
+    """
+    if not token_ids:
+        return np.empty((0, 0), dtype=np.float32)
+
+    model = get_embedding_model()
+    order = sorted(range(len(token_ids)), key=lambda i: len(token_ids[i]))
+    ordered = [token_ids[i] for i in order]
+    if isinstance(model, OnnxSentenceEncoder):
+        encoded = model.encode_token_ids(ordered, batch_size=batch_size)
+    else:
+        encoded = _encode_token_ids_torch(model, ordered, batch_size)
+
+    embeddings = np.empty_like(encoded)
+    embeddings[order] = encoded
+    return embeddings
+
+
+def _encode_token_ids_torch(model, token_ids: List[List[int]], batch_size: int) -> np.ndarray:
+    # SentenceTransformer.encode minus its tokenize step: pad, forward, take the pooled output
+    import torch
+
+    tokenizer = model.tokenizer
+    batches = []
+    with torch.inference_mode():
+        for start in range(0, len(token_ids), batch_size):
+            features = tokenizer.pad(
+                {"input_ids": [tokenizer.build_inputs_with_special_tokens(ids)
+                               for ids in token_ids[start:start + batch_size]]},
+                return_tensors="pt"
+            )
+            features["token_type_ids"] = torch.zeros_like(features["input_ids"])
+            features = {key: value.to(model.device) for key, value in features.items()}
+            pooled = model(features)["sentence_embedding"]
+            batches.append(torch.nn.functional.normalize(pooled, dim=1).float().cpu().numpy())
+    return np.concatenate(batches)
+
+
+# Hot queries skip the model and the database. TTLCache is not thread-safe and the
+# sync routes run in a thread pool, so all access goes through _CACHE_LOCK.
+_EMB_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+_RES_CACHE: TTLCache = TTLCache(maxsize=2_000, ttl=600)
+_CACHE_LOCK = threading.Lock()
+_CACHE_STATS: Counter = Counter()
+
+
+def _query_key(provider: str, query: str) -> str:
+    # The provider is part of the key: the same text embeds differently per provider
+    key = f"{provider}\0{query}"
+    return _hasher(key.encode("utf-8")).hexdigest()
+
+
+def cache_stats() -> Dict[str, int]:
+    """Hit/miss counters for the embedding and result caches."""
+    with _CACHE_LOCK:
+        return dict(_CACHE_STATS)
+
+
+def clear_retrieval_cache() -> None:
+    """Drops cached results and FAISS mirrors, e.g. after the papers table has been rebuilt."""
+    with _CACHE_LOCK:
+        _RES_CACHE.clear()
+    with _FAISS_LOCK:
+        _FAISS_MIRRORS.clear()
+
+
+def _embed_with(provider: str, queries: List[str]) -> np.ndarray:
+    """Unit-length float32 embeddings for a batch, with the given provider."""
+    if provider == "sentence-transformer":
+        return embed_queries(queries)
+    # Imported here: the ingestion module itself imports this one
+    from server.src.ingestion.embeddings import generate_embeddings, l2_normalize
+    return l2_normalize(generate_embeddings(queries, override_provider=provider))
+
+
+def _embed_batch(items: List[Tuple[str, str]]) -> List[np.ndarray]:
+    """
+    Embeds (provider, query) items, one call per provider. The provider is the one
+    in effect when each query was submitted, not when the batch runs.
+    """
+    by_provider: Dict[str, List[int]] = {}
+    for i, (provider, _) in enumerate(items):
+        by_provider.setdefault(provider, []).append(i)
+
+    results: List[Any] = [None] * len(items)
+    for provider, indices in by_provider.items():
+        embeddings = _embed_with(provider, [items[i][1] for i in indices])
+        for i, embedding in zip(indices, embeddings):
+            results[i] = embedding
+    return results
+
+
+@lru_cache(maxsize=1)
+def _query_batcher() -> MicroBatcher:
+    # Concurrent requests that miss the cache share one forward pass / provider call
+    return MicroBatcher(_embed_batch, max_batch=32,
+                        max_wait=settings.embed_batch_window_ms / 1000, name="embed-query")
+
+
+def embed_query(query: str) -> np.ndarray:
+    """
+    Embeds a single query (unit length) with the configured embedding provider,
+    memoised for an hour. The query must be embedded the same way as the stored chunks.
+    """
+    provider = settings.embedding_provider
+    key = _query_key(provider, query)
+    with _CACHE_LOCK:
+        embedding = _EMB_CACHE.get(key)
+        _CACHE_STATS["embedding_hits" if embedding is not None else "embedding_misses"] += 1
+    if embedding is not None:
+        return embedding
+
+    # Unit length, like every stored embedding (see l2_normalize in ingestion)
+    if settings.embed_batch_window_ms > 0:
+        embedding = np.array(_query_batcher().submit((provider, query)), dtype=np.float32)
+    elif provider == "sentence-transformer":
+        embedding = np.asarray(get_embedding_model().encode(
+            query, convert_to_tensor=False, normalize_embeddings=True
+        ), dtype=np.float32)
+    else:
+        # Imported here: the ingestion module itself imports this one
+        from server.src.ingestion.embeddings import generate_embeddings, l2_normalize
+        embedding = l2_normalize(generate_embeddings([query], override_provider=provider))[0]
+    embedding.setflags(write=False)  # shared by every later hit
+    with _CACHE_LOCK:
+        _EMB_CACHE[key] = embedding
+    return embedding
+
+
+class _VectorConnection(PGConnection):
+    """Connection that registers the pgvector adapters once, when it is opened."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Lets numpy embeddings be passed straight in as query parameters
+        register_vector(self)
+        # register_vector's type lookup opened a transaction; end it
+        self.rollback()
+
+
+# One connection pool per distinct db_config, created on first use
+_POOLS: Dict[Tuple, ThreadedConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _get_pool(db_config: dict) -> ThreadedConnectionPool:
+    key = tuple(sorted(db_config.items()))
+    pool = _POOLS.get(key)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.get(key)
+            if pool is None:
+                pool = _POOLS[key] = ThreadedConnectionPool(
+                    1, 16, connection_factory=_VectorConnection, **db_config)
+    return pool
 
 
 def get_db_connection(db_config: dict):
     """
-    Establishes a connection to the Postgres database.
+    Borrows a connection to the Postgres database from a shared pool.
 
     Args:
         db_config (dict): Dictionary containing Postgres connection details (dbname, user, password, host, port).
 
     Returns:
-        psycopg2.connection: The connection object.
+        psycopg2.connection: The connection object. Hand it back with release_db_connection.
+    """
+    return _get_pool(db_config).getconn()
+
+
+def release_db_connection(conn, db_config: dict) -> None:
+    """Returns a borrowed connection to its pool; broken connections are discarded."""
+    _get_pool(db_config).putconn(conn, close=bool(conn.closed))
+
+
+# VECTOR_BACKEND=faiss: one in-memory mirror per db_config, loaded from Postgres on first use
+_FAISS_MIRRORS: Dict[Tuple, FaissMirror] = {}
+_FAISS_LOCK = threading.Lock()
+
+
+def get_faiss_mirror(db_config: dict) -> Optional[FaissMirror]:
+    """
+    Returns the FAISS mirror of the papers table, building it on first call.
+
+    Returns None while the table is empty (e.g. first boot, before any rebuild);
+    nothing is cached then, so a later call builds the mirror once rows exist.
+    """
+    key = tuple(sorted(db_config.items()))
+    mirror = _FAISS_MIRRORS.get(key)
+    if mirror is None:
+        with _FAISS_LOCK:
+            mirror = _FAISS_MIRRORS.get(key)
+            if mirror is None:
+                conn = get_db_connection(db_config)
+                try:
+                    mirror = FaissMirror.from_postgres(conn, ef_search=settings.hnsw_ef_search)
+                except ValueError as e:
+                    logger.warning("FAISS mirror not built, using pgvector search: %s", e)
+                    return None
+                finally:
+                    release_db_connection(conn, db_config)
+                _FAISS_MIRRORS[key] = mirror
+    return mirror
+
+
+def close_db_pools() -> None:
+    """Closes every pooled connection (called on app shutdown)."""
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.closeall()
+        _POOLS.clear()
+
+
+# Embeddings are unit length, so `<#>` (negative inner product) ranks identically to
+# cosine `<=>` without the per-row norms; 1 + (a <#> b) is the same cosine distance.
+# The untyped embedding literal resolves to the column's type (vector or halfvec).
+_SEARCH_SQL = """
+SELECT {columns}, 1 + (embedding <#> %(embedding)s) AS similarity
+FROM papers
+ORDER BY embedding <#> %(embedding)s
+LIMIT %(top_k)s;
+"""
+
+# Upper bound on chunk text returned per row, so one oversized chunk can't bloat the payload
+MAX_CHUNK_CHARS = 4000
+
+
+def _search(columns: str, query: str, top_k: int, db_config: dict) -> List[Tuple]:
+    """Runs the nearest-neighbour query, returning `columns` plus the distance per row."""
+    query_embedding = embed_query(query)
+
+    # Borrow a pooled connection rather than paying a fresh connect per query
+    conn = get_db_connection(db_config)
+
+    try:
+        with conn.cursor() as cursor:
+            # Index search breadth for this transaction only (recall vs. speed)
+            if settings.vector_index == "ivfflat":
+                cursor.execute("SET LOCAL ivfflat.probes = %s;", (settings.ivfflat_probes,))
+            else:
+                cursor.execute("SET LOCAL hnsw.ef_search = %s;", (settings.hnsw_ef_search,))
+            cursor.execute(
+                _SEARCH_SQL.format(columns=columns),
+                {"embedding": query_embedding, "top_k": top_k, "max_chars": MAX_CHUNK_CHARS}
+            )
+            return cursor.fetchall()
+    finally:
+        release_db_connection(conn, db_config)
+
+
+def retrieve_top_k_ids(query: str, top_k: int, db_config: dict) -> List[Tuple[int, float]]:
+    """
+    Like retrieve_top_k_chunks but returns only (id, similarity_score) pairs, leaving the
+    chunk text in the database. Hydrate the survivors with fetch_chunks_by_id.
     """
-    return psycopg2.connect(**db_config)
+    if settings.vector_backend == "faiss":
+        mirror = get_faiss_mirror(db_config)
+        if mirror is not None:
+            return mirror.search(embed_query(query), top_k)
+    return _search("id", query, top_k, db_config)
 
 
-@opik.track
+def fetch_chunks_by_id(ids: List[int], db_config: dict) -> List[Dict]:
+    """
+    Loads id/title/chunk for the given ids, in the order given.
+
+    Args:
+        ids (List[int]): Paper chunk ids, e.g. from retrieve_top_k_ids.
+        db_config (dict): Dictionary containing Postgres connection details.
+
+    Returns:
+        List[Dict]: One dict per id found.
+    """
+    if not ids:
+        return []
+
+    conn = get_db_connection(db_config)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, title, left(chunk, %s) FROM papers WHERE id = ANY(%s);",
+                (MAX_CHUNK_CHARS, list(ids))
+            )
+            rows = {row[0]: row for row in cursor.fetchall()}
+    finally:
+        release_db_connection(conn, db_config)
+
+    return [
+        {"id": rows[i][0], "title": rows[i][1], "chunk": rows[i][2]}
+        for i in ids if i in rows
+    ]
+
+
+def _top_k_rows(query: str, top_k: int, db_config: dict) -> Tuple[Tuple, ...]:
+    """(id, title, chunk, similarity_score) rows for the query, through the result cache."""
+    cache_key = (_query_key(settings.embedding_provider, query), top_k, tuple(sorted(db_config.items())))
+    with _CACHE_LOCK:
+        cached = _RES_CACHE.get(cache_key)
+        _CACHE_STATS["result_hits" if cached is not None else "result_misses"] += 1
+    if cached is not None:
+        return cached
+
+    # embedding_model = (
+    #     app.state.embedding_model
+    # )  # TODO: get reference to app state from Request...
+    if settings.vector_backend == "faiss":
+        # FAISS picks the ids; Postgres only serves the text for those rows
+        scores = dict(retrieve_top_k_ids(query, top_k, db_config))
+        rows = [
+            (doc["id"], doc["title"], doc["chunk"], scores[doc["id"]])
+            for doc in fetch_chunks_by_id(list(scores), db_config)
+        ]
+    else:
+        rows = _search(
+            "id, title, left(chunk, %(max_chars)s) AS chunk", query, top_k, db_config
+        )
+
+    # Tuples are immutable, so cached rows can be handed out without copying
+    rows = tuple(tuple(row) for row in rows)
+    with _CACHE_LOCK:
+        _RES_CACHE[cache_key] = rows
+    return rows
+
+
+@maybe_track
 def retrieve_top_k_chunks(query: str, top_k: int, db_config: dict) -> List[Dict]:
     """
     Retrieves the top_k documents based on cosine similarity to the query embedding using pgvector.
@@ -35,46 +459,29 @@ def retrieve_top_k_chunks(query: str, top_k: int, db_config: dict) -> List[Dict]
         db_config (dict): Dictionary containing Postgres connection details.
 
     Returns:
-        List[Dict]: A list of dictionaries containing the top_k chunks with their titles and summaries.
+        List[Dict]: A list of dictionaries containing the top_k chunks with their titles and
+        summaries. Chunk text is capped at MAX_CHUNK_CHARS characters.
     """
-    # Generate the embedding for the query
-    # embedding_model = (
-    #     app.state.embedding_model
-    # )  # TODO: get reference to app state from Request...
-    query_embedding = embedding_model.encode(
-        query, convert_to_tensor=False
-    )
-    
-    # Convert to list if it's a numpy array
-    if hasattr(query_embedding, 'tolist'):
-        query_embedding = query_embedding.tolist()
-
-    # Connect to the database
-    conn = get_db_connection(db_config)
+    # Prepare the results
+    return [
+        {"id": row[0], "title": row[1], "chunk": row[2], "similarity_score": row[3]}
+        for row in _top_k_rows(query, top_k, db_config)
+    ]
 
-    try:
-        cursor = conn.cursor()
-
-        # SQL query to find the top_k chunks using cosine similarity
-        query = """
-        SELECT id, title, chunk, embedding <=> %s::vector AS similarity
-        FROM papers
-        ORDER BY similarity ASC
-        LIMIT %s;
-        """
-
-        # Execute the query with the query embedding and top_k value
-        cursor.execute(query, (query_embedding, top_k))
-        rows = cursor.fetchall()
-
-        # Prepare the results
-        results = [
-            {"id": row[0], "title": row[1], "chunk": row[2], "similarity_score": row[3]}
-            for row in rows
-        ]
 
-        return results
+def retrieve_top_k_chunks_soa(query: str, top_k: int, db_config: dict) -> Dict[str, Any]:
+    """
+    Column-oriented variant of retrieve_top_k_chunks for rerankers and filters that
+    work on whole arrays, e.g. `keep = result["scores"] < threshold`.
 
-    finally:
-        cursor.close()
-        conn.close()
+    Returns:
+        Dict[str, Any]: "ids" (int64 array), "titles" and "chunks" (lists of str) and
+        "scores" (float32 array of distances), all aligned and nearest first.
+    """
+    rows = _top_k_rows(query, top_k, db_config)
+    return {
+        "ids": np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+        "titles": [row[1] for row in rows],
+        "chunks": [row[2] for row in rows],
+        "scores": np.fromiter((row[3] for row in rows), dtype=np.float32, count=len(rows)),
+    }
@@ -0,0 +1,140 @@
+"""Semantic response cache
+
+Serves a previous LLM response when a new query is a near-paraphrase of an earlier
+one (cosine similarity >= settings.semantic_cache_threshold) *and* was answered
+from the same retrieved chunks with the same provider and sampling settings.
+Hits skip the LLM call entirely. Enable with SEMANTIC_CACHE_ENABLED=true.
+
+The cache is per process; with several workers each keeps its own.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+import numpy as np
+from server.src.config import settings
+
+
+class SemanticCache:
+    """
+    Fixed-capacity store of (unit-length query embedding, scope, response) entries.
+
+    Embeddings live in one preallocated float32 matrix, so a lookup is a single
+    matrix-vector product. Entries expire after `ttl` seconds and the least recently
+    used one is evicted when the cache is full.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._matrix: Optional[np.ndarray] = None
+        self._entries: "OrderedDict[int, tuple[Hashable, Dict, float]]" = OrderedDict()
+        self._free: List[int] = []
+        self._lock = threading.Lock()
+
+    def get(self, embedding: np.ndarray, scope: Hashable, threshold: float) -> Optional[Dict]:
+        """Returns the cached response for the most similar live entry in `scope`, if any."""
+        with self._lock:
+            if not self._entries or self._matrix.shape[1] != embedding.shape[0]:
+                return None
+
+            now = time.monotonic()
+            similarities = self._matrix @ embedding
+            candidates = np.flatnonzero(similarities >= threshold)
+            for slot in candidates[np.argsort(-similarities[candidates])].tolist():
+                entry = self._entries.get(slot)
+                if entry is None or entry[0] != scope:
+                    continue
+                if entry[2] < now:
+                    self._release(slot)
+                    continue
+                self._entries.move_to_end(slot)
+                return entry[1]
+            return None
+
+    def put(self, embedding: np.ndarray, scope: Hashable, response: Dict) -> None:
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != embedding.shape[0]:
+                # First entry, or the embedding provider (and so the dimension) changed
+                self._matrix = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+                self._entries.clear()
+                self._free = list(range(self.max_entries - 1, -1, -1))
+
+            if not self._free:
+                self._release(next(iter(self._entries)))  # least recently used
+            slot = self._free.pop()
+
+            self._matrix[slot] = embedding
+            self._entries[slot] = (scope, response, time.monotonic() + self.ttl)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._matrix = None
+            self._entries.clear()
+            self._free = []
+
+    def _release(self, slot: int) -> None:
+        # A zero row can never clear the threshold, so freed slots need no masking
+        self._matrix[slot] = 0.0
+        del self._entries[slot]
+        self._free.append(slot)
+
+
+_CACHE = SemanticCache()
+
+
+def _scope(chunks: List[Dict], max_tokens: int, temperature: float) -> Hashable:
+    # Same question over different context, or with another model, is a different answer
+    return (
+        settings.llm_provider,
+        settings.embedding_provider,
+        max_tokens,
+        temperature,
+        tuple(chunk.get("id") for chunk in chunks),
+    )
+
+
+def _embed(query: str, query_embedding: Optional[np.ndarray]) -> np.ndarray:
+    if query_embedding is not None:
+        return np.asarray(query_embedding, dtype=np.float32)
+    # Imported here to keep generation free of the retrieval stack when the cache is off;
+    # embed_query is memoised, so this reuses the embedding retrieval already computed.
+    from server.src.services.retrieval_service import embed_query
+    return embed_query(query)
+
+
+def get_cached_response(
+    query: str,
+    chunks: List[Dict],
+    max_tokens: int,
+    temperature: float,
+    query_embedding: Optional[np.ndarray] = None,
+) -> Optional[Dict]:
+    """
+    Looks up a response for a semantically equivalent earlier query, or None.
+    Pass the unit-length `query_embedding` used for retrieval to avoid re-embedding.
+    """
+    return _CACHE.get(
+        _embed(query, query_embedding),
+        _scope(chunks, max_tokens, temperature),
+        settings.semantic_cache_threshold
+    )
+
+
+def cache_response(
+    query: str,
+    chunks: List[Dict],
+    max_tokens: int,
+    temperature: float,
+    result: Dict,
+    query_embedding: Optional[np.ndarray] = None,
+) -> None:
+    """Stores an LLM result; error placeholders from call_llm are not cached."""
+    if str(result.get("response", "")).startswith("⚠️ Error"):
+        return
+    _CACHE.put(_embed(query, query_embedding), _scope(chunks, max_tokens, temperature), result)
+
+
+def clear_semantic_cache() -> None:
+    """Drops every cached response, e.g. after the papers table has been rebuilt."""
+    _CACHE.clear()
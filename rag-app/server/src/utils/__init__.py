@@ -1,3 +1,8 @@
 from .bedrock_client_factory import get_bedrock_client
+from .faiss_index import FaissMirror
+from .micro_batcher import MicroBatcher
+from .onnx_encoder import OnnxSentenceEncoder
+from .pg_copy import copy_papers
+from .tracing import maybe_track
 
-__all__ = ['get_bedrock_client']
+__all__ = ['get_bedrock_client', 'FaissMirror', 'MicroBatcher', 'OnnxSentenceEncoder', 'copy_papers', 'maybe_track']
@@ -3,17 +3,42 @@
 """
 Factory for creating boto3 Bedrock clients using live STS credentials.
 """
-import boto3
+from functools import lru_cache
+from typing import Optional
 from server.src.services.runtime_credentials import get_aws_credentials
 from server.src.config import settings
 
 
-def get_bedrock_client():
-    creds = get_aws_credentials()
+@lru_cache(maxsize=4)
+def _build_bedrock_client(region: str, access_key: str, secret_key: str,
+                          session_token: Optional[str]):
+    # boto3 is imported on first use so non-Bedrock deployments never load it.
+    # Client construction loads botocore service models (hundreds of ms), so it is
+    # done once per credential set; a refreshed STS token gets a fresh client.
+    import boto3
+    from botocore.config import Config
+
     return boto3.client(
         "bedrock-runtime",
-        region_name=settings.aws_region,
-        aws_access_key_id=creds["access_key"],
-        aws_secret_access_key=creds["secret_key"],
-        aws_session_token=creds["session_token"]
+        region_name=region,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        aws_session_token=session_token,
+        # Adaptive retries back off client-side under throttling; keep-alive and a
+        # wider pool let concurrent embedding/generation calls reuse TLS connections
+        config=Config(
+            retries={"mode": "adaptive", "max_attempts": 5},
+            tcp_keepalive=True,
+            max_pool_connections=32,
+        )
+    )
+
+
+def get_bedrock_client():
+    creds = get_aws_credentials()
+    return _build_bedrock_client(
+        settings.aws_region,
+        creds["access_key"],
+        creds["secret_key"],
+        creds["session_token"]
     )
@@ -0,0 +1,62 @@
+# server/src/utils/faiss_index.py
+
+"""
+In-memory FAISS mirror of the papers embeddings for corpora that fit in RAM.
+
+Postgres stays the source of truth: the mirror is loaded from it once and only
+answers "which ids are nearest"; chunk text is still read from Postgres.
+Install with `poetry install --with faiss` and set VECTOR_BACKEND=faiss.
+"""
+from typing import List, Tuple
+import numpy as np
+
+
+def _as_float32(value) -> np.ndarray:
+    # vector columns come back as ndarrays, halfvec columns as pgvector HalfVector
+    if hasattr(value, "to_numpy"):
+        value = value.to_numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+class FaissMirror:
+    """
+    HNSW inner-product index over the unit-length embeddings, keyed by paper id.
+    Distances are reported as 1 - inner product, the same scale as pgvector retrieval.
+    """
+
+    def __init__(self, ids: np.ndarray, embeddings: np.ndarray, ef_search: int = 40):
+        import faiss
+
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        hnsw = faiss.IndexHNSWFlat(matrix.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = 64
+        hnsw.hnsw.efSearch = ef_search
+
+        self.index = faiss.IndexIDMap(hnsw)
+        self.index.add_with_ids(matrix, np.asarray(ids, dtype=np.int64))
+
+    @classmethod
+    def from_postgres(cls, conn, ef_search: int = 40) -> "FaissMirror":
+        """
+        Loads every (id, embedding) row; `conn` must have pgvector adapters registered.
+        Raises ValueError if the papers table is empty.
+        """
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, embedding FROM papers;")
+            rows = cursor.fetchall()
+        if not rows:
+            raise ValueError("papers table is empty; nothing to mirror into FAISS")
+
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        embeddings = np.stack([_as_float32(row[1]) for row in rows])
+        return cls(ids, embeddings, ef_search=ef_search)
+
+    def search(self, query_embedding: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """Returns up to top_k (id, distance) pairs, nearest first."""
+        query = np.ascontiguousarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        scores, ids = self.index.search(query, top_k)
+        return [
+            (int(i), float(1.0 - s))
+            for i, s in zip(ids[0], scores[0])
+            if i != -1
+        ]
@@ -0,0 +1,179 @@
+# server/src/utils/http_client.py
+
+"""
+Shared HTTP plumbing for provider calls: a pooled requests.Session and a pooled
+httpx.AsyncClient, both retrying throttling/5xx responses with exponential backoff,
+default timeouts, and a small circuit breaker so a dead provider fails fast
+instead of stalling every request.
+"""
+import threading
+import time
+from functools import lru_cache
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import retry, retry_if_exception_type, retry_if_result, stop_after_attempt, wait_exponential
+from urllib3.util.retry import Retry
+
+# (connect, read) seconds — without this a hung connect waits for the OS TCP timeout
+DEFAULT_TIMEOUT = (5.0, 60.0)
+
+# Throttling and transient upstream errors; retried with backoff on both paths
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+@lru_cache(maxsize=1)
+def get_http_session() -> requests.Session:
+    """
+    Returns the process-wide session; its connection pool keeps TLS sessions alive
+    across provider calls.
+    """
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=sorted(RETRY_STATUSES),
+        allowed_methods=["POST"],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    # Sized for the FastAPI worker thread pool so sockets aren't discarded under load
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=50, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def new_async_http_client() -> httpx.AsyncClient:
+    """
+    An async client with the shared timeouts and pool limits. HTTP/2 multiplexes
+    concurrent requests to the same host over one TLS connection.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT[1], connect=DEFAULT_TIMEOUT[0]),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+    )
+
+
+@lru_cache(maxsize=1)
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Process-wide async client for provider calls made from the app's event loop.
+    Its connections are bound to that loop; code running under its own
+    asyncio.run should use a new_async_http_client() instead.
+    """
+    return new_async_http_client()
+
+
+@retry(
+    retry=retry_if_exception_type(httpx.TransportError)
+    | retry_if_result(lambda response: response.status_code in RETRY_STATUSES),
+    stop=stop_after_attempt(4),
+    wait=wait_exponential(multiplier=0.5, max=8),
+    # Out of attempts on a retryable status: hand back the last response, as the
+    # sync session does, and let the caller's parsing surface the error
+    retry_error_callback=lambda state: state.outcome.result(),
+)
+async def apost(client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+    """client.post with the sync session's retry policy: backoff on 429/5xx and transport errors."""
+    return await client.post(url, **kwargs)
+
+
+async def aclose_async_http_client():
+    if get_async_http_client.cache_info().currsize:
+        await get_async_http_client().aclose()
+        get_async_http_client.cache_clear()
+
+
+class CircuitBreakerOpenError(RuntimeError):
+    """Raised instead of calling a provider whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `fail_max` consecutive failures and rejects calls for `reset_timeout`
+    seconds. After that it is half-open: exactly one call is let through as a probe
+    and every other call is still rejected until the probe resolves. Success closes
+    the breaker, failure re-opens it for another `reset_timeout`.
+    """
+
+    def __init__(self, name: str, fail_max: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitBreakerOpenError(
+                    f"{self.name} circuit is open after {self._failures} failures; failing fast")
+            self._probing = True  # half-open: this caller is the probe
+
+    def _on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.fail_max or self._opened_at is not None:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def _on_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def _on_abandon(self):
+        # Cancelled or interrupted before an outcome: free the probe slot, change nothing else
+        with self._lock:
+            self._probing = False
+
+    def call(self, func, *args, **kwargs):
+        self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._on_failure()
+            raise
+        except BaseException:
+            self._on_abandon()
+            raise
+        self._on_success()
+        return result
+
+    def stream(self, func, *args, **kwargs):
+        """Same as call, for generator functions: the whole stream is one call."""
+        self._before_call()
+        try:
+            yield from func(*args, **kwargs)
+        except Exception:
+            self._on_failure()
+            raise
+        except GeneratorExit:
+            # The consumer stopped reading; the provider was answering, so not a failure
+            self._on_success()
+            raise
+        except BaseException:
+            self._on_abandon()
+            raise
+        self._on_success()
+
+    async def acall(self, func, *args, **kwargs):
+        """Same as call, for coroutine functions."""
+        self._before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self._on_failure()
+            raise
+        except BaseException:  # e.g. asyncio.CancelledError
+            self._on_abandon()
+            raise
+        self._on_success()
+        return result
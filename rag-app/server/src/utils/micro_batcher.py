@@ -0,0 +1,63 @@
+# server/src/utils/micro_batcher.py
+
+"""
+Coalesces single-item calls from concurrent request threads into batched calls.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from any thread for up to `max_wait` seconds (or until
+    `max_batch` are waiting) and hands them to `fn` as one list. `fn` must return one
+    result per item, in order; if it raises or returns the wrong number of results,
+    every caller in the batch gets the error. The caller of `submit` blocks until its
+    result is in, or raises TimeoutError after `timeout` seconds.
+
+    A lone request pays at most `max_wait` extra latency; under concurrent load the
+    per-call overhead (a model forward pass, an HTTP round-trip) is shared.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], Sequence[Any]],
+                 max_batch: int = 32, max_wait: float = 0.01, timeout: float = 60.0,
+                 name: str = "micro-batcher"):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item: Any) -> Any:
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout=self.timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self._worker.name}: got {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,106 @@
+# server/src/utils/onnx_encoder.py
+
+"""
+ONNX Runtime drop-in for SentenceTransformer.encode (CPU, or CUDA when available).
+
+Build the model once with `make export-onnx` (optimum export + int8 dynamic
+quantization), then point EMBEDDING_ONNX_PATH at the output directory.
+"""
+import os
+from typing import List, Tuple, Union
+import numpy as np
+
+_DEFAULT_TOKENIZER = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def _pick_runtime(model_path: str) -> Tuple[str, str]:
+    """
+    Chooses the model file and ONNX Runtime execution provider.
+
+    The fp32 graph runs on CUDA when onnxruntime-gpu sees a GPU; dynamic int8
+    quantization only pays off on CPU (VNNI/AVX2 kernels), so the quantized
+    graph is preferred there.
+    """
+    import onnxruntime
+
+    has_fp32 = os.path.exists(os.path.join(model_path, "model.onnx"))
+    has_int8 = os.path.exists(os.path.join(model_path, "model_quantized.onnx"))
+
+    if has_fp32 and "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+        return "model.onnx", "CUDAExecutionProvider"
+    return ("model_quantized.onnx" if has_int8 else "model.onnx"), "CPUExecutionProvider"
+
+
+class OnnxSentenceEncoder:
+    """
+    Mean-pooled, L2-normalised sentence embeddings from an exported transformer,
+    matching the output of SentenceTransformer("all-MiniLM-L6-v2").encode.
+    """
+
+    def __init__(self, model_path: str):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        has_tokenizer = os.path.exists(os.path.join(model_path, "tokenizer.json"))
+        file_name, provider = _pick_runtime(model_path)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            model_path if has_tokenizer else _DEFAULT_TOKENIZER)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_path,
+            file_name=file_name,
+            provider=provider
+        )
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 64,
+        normalize_embeddings: bool = True,
+        **kwargs
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                return_tensors="np"
+            )
+            batches.append(self._pool(inputs, normalize_embeddings))
+
+        embeddings = np.concatenate(batches) if batches else np.empty((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+    def encode_token_ids(
+        self,
+        token_ids: List[List[int]],
+        batch_size: int = 64,
+        normalize_embeddings: bool = True
+    ) -> np.ndarray:
+        """
+        Like encode, but for texts already tokenized with self.tokenizer (without
+        special tokens), so ingestion can chunk and embed from one tokenization.
+        """
+        batches = []
+        for start in range(0, len(token_ids), batch_size):
+            inputs = self.tokenizer.pad(
+                {"input_ids": [self.tokenizer.build_inputs_with_special_tokens(ids)
+                               for ids in token_ids[start:start + batch_size]]},
+                return_tensors="np"
+            )
+            inputs["token_type_ids"] = np.zeros_like(inputs["input_ids"])
+            batches.append(self._pool(inputs, normalize_embeddings))
+
+        return np.concatenate(batches) if batches else np.empty((0, 0), dtype=np.float32)
+
+    def _pool(self, inputs, normalize_embeddings: bool) -> np.ndarray:
+        hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if normalize_embeddings:
+            pooled /= np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled.astype(np.float32, copy=False)
@@ -0,0 +1,21 @@
+# server/src/utils/tracing.py
+
+"""
+Opik tracing helpers that compile away to nothing when tracing is disabled.
+"""
+import opik
+from server.src.config import settings
+
+
+def maybe_track(func=None, **track_kwargs):
+    """
+    Drop-in replacement for `@opik.track` / `@opik.track(...)`.
+
+    When `settings.enable_tracing` is False the function is returned undecorated,
+    so hot paths carry no wrapper frame or argument capture at all.
+    """
+    if func is None:
+        return lambda f: maybe_track(f, **track_kwargs)
+    if not settings.enable_tracing:
+        return func
+    return opik.track(**track_kwargs)(func)
@@ -0,0 +1,63 @@
+"""
+Lightweight stand-ins for the models and SDK clients the services call.
+
+Shared by conftest fixtures and test modules so every test sees the same objects.
+"""
+from types import SimpleNamespace
+import numpy as np
+
+# One read-only, unit-length 384-dim embedding (matches the papers table's
+# vector(384)), like every embedding the services produce; writes raise instead
+# of leaking between tests.
+EMBEDDING_384 = np.full(384, 1 / np.sqrt(384), dtype=np.float32)
+EMBEDDING_384.setflags(write=False)
+
+# A unit vector orthogonal to EMBEDDING_384, to tilt the seed rows away from it
+_ORTHOGONAL_384 = np.tile(np.array([1.0, -1.0], dtype=np.float32), 192) / np.sqrt(384)
+
+# Papers seeded into the test database, one unit-length embedding row each. Row i
+# is EMBEDDING_384 rotated by angle[i] towards _ORTHOGONAL_384, so the rows sit at
+# strictly decreasing cosine similarity with it (cos 0.2 > cos 0.5 > cos 0.8) and
+# the expected ranking is unambiguous (paper 1, then 2, then 3).
+SEED_PAPERS = (
+    ("Test Paper 1", "Perovskite materials are used in solar cells."),
+    ("Test Paper 2", "Perovskites have unique electronic properties."),
+    ("Test Paper 3", "The efficiency of perovskite solar cells has improved."),
+)
+SEED_EMBEDDINGS = np.stack([
+    np.cos(angle) * EMBEDDING_384 + np.sin(angle) * _ORTHOGONAL_384 for angle in (0.2, 0.5, 0.8)
+]).astype(np.float32)
+SEED_EMBEDDINGS.setflags(write=False)
+
+
+class FakeEmbedder:
+    """Stands in for SentenceTransformer: always returns the same 384-dim embedding."""
+
+    def encode(self, *args, **kwargs):
+        return EMBEDDING_384
+
+
+class FakeOpenAIClient:
+    """Stands in for openai.OpenAI with a canned chat completion."""
+
+    _COMPLETION = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="test response"))],
+        usage=SimpleNamespace(total_tokens=2, completion_tokens=1)
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=lambda **kw: self._COMPLETION))
+
+    def close(self):
+        pass
+
+
+class FakeCallable:
+    """A plain callable with MagicMock's `.return_value` API, minus the introspection."""
+
+    def __init__(self, return_value=None):
+        self.return_value = return_value
+
+    def __call__(self, *args, **kwargs):
+        return self.return_value
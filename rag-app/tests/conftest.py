@@ -1,184 +1,239 @@
+import os
 import pytest
-from unittest.mock import patch, MagicMock
+from functools import lru_cache
 import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
-from pydantic_settings import BaseSettings
-from pydantic import Field, SecretStr, AnyHttpUrl
+from pydantic import SecretStr, AnyHttpUrl
+from types import MappingProxyType
 from typing import Optional, Dict, Any
-
-# Mock AWS credentials
-mock_credentials = {
-    "access_key": "test-access-key",
-    "secret_key": "test-secret-key",
-    "session_token": "test-session-token"
-}
-
-@pytest.fixture(autouse=True)
+from server.src.config import Settings
+from tests._fakes import (
+    SEED_EMBEDDINGS, SEED_PAPERS, FakeCallable, FakeEmbedder, FakeOpenAIClient)
+
+# Set by pytest-xdist in each worker process ("gw0", "gw1", ...)
+_XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER")
+_TEST_SCHEMA = f"pytest_{_XDIST_WORKER}"
+
+# All test DDL, sent in one execute(). The extension is pinned to public so every
+# xdist worker schema can resolve `vector`.
+SCHEMA_SQL = f"""
+CREATE EXTENSION IF NOT EXISTS vector SCHEMA public;
+{"" if _XDIST_WORKER is None else f"CREATE SCHEMA IF NOT EXISTS {_TEST_SCHEMA};"}
+CREATE TABLE IF NOT EXISTS papers (
+    id SERIAL PRIMARY KEY,
+    title TEXT,
+    chunk TEXT,
+    embedding vector(384)
+);
+"""
+
+# (title, chunk, 384-dim pgvector literal) per seeded paper, built once at import
+SEED_ROWS = [
+    (title, chunk, "[" + ",".join(map(str, embedding.tolist())) + "]")
+    for (title, chunk), embedding in zip(SEED_PAPERS, SEED_EMBEDDINGS)
+]
+
+# Fixture data shared read-only by every test; built once per session
+_MOCK_QUERY = "Tell me about perovskites in solar cells."
+
+_MOCK_CHUNKS = tuple(MappingProxyType(chunk) for chunk in (
+    {"text": "Perovskite materials are used in solar cells."},
+    {"text": "Perovskites have unique electronic properties."},
+    {"text": "The efficiency of perovskite solar cells has improved."},
+))
+
+_MOCK_CONFIG = MappingProxyType({
+    "max_tokens": 150,
+    "temperature": 0.7,
+})
+
+_DB_CONFIG = MappingProxyType({
+    "dbname": "test_db",
+    "user": "test_user",
+    "password": "test_password",
+    "host": "localhost",
+    "port": "5432",
+})
+
+
+class TestSettings(Settings):
+    """Settings pinned to fixed test values."""
+
+    class Config:
+        validate_assignment = True
+        arbitrary_types_allowed = True
+
+    # Override the parent class to provide default values for testing
+    environment: str = "test"
+    app_name: str = "rag-app"
+    debug: bool = True
+
+    # Database settings
+    postgres_host: str = "localhost"
+    postgres_db: str = "test_db"
+    postgres_user: str = "test_user"
+    postgres_password: str = "test_password"
+    postgres_port: int = 5432
+
+    # API settings
+    arxiv_api_url: AnyHttpUrl = "https://export.arxiv.org/api/query"
+    data_path: str = "./data"
+
+    # Model settings
+    llm_provider: str = "openai"
+    embedding_provider: str = "sentence-transformer"
+    temperature: float = 0.7
+    top_p: float = 0.9
+    max_tokens: int = 1000
+
+    # OpenAI settings
+    openai_api_key: str = "test-key"
+    openai_model: str = "gpt-3.5-turbo"
+    openai_embedding_model: str = "text-embedding-ada-002"
+
+    # AWS settings
+    aws_region: str = "us-east-1"
+    aws_access_key_id: SecretStr = SecretStr("test-key")
+    aws_secret_access_key: SecretStr = SecretStr("test-secret")
+    aws_session_token: Optional[SecretStr] = None
+    bedrock_model_id: str = "test-model"
+    bedrock_embedding_model_id: str = "test-embedding-model"
+
+    # Ollama settings
+    #ollama_url: AnyHttpUrl = "http://localhost:11434"
+    #ollama_model: str = "llama2"
+    #ollama_embedding_model: str = "llama2"
+
+    # Opik settings
+    opik_api_key: str = "test-key"
+    opik_workspace: str = "test-workspace"
+    opik_project_name: str = "rag-app-test"
+
+    # RAG config
+    rag_config: Dict[str, Any] = {}
+
+
+@lru_cache(maxsize=1)
+def _make_settings() -> TestSettings:
+    """Validates TestSettings once per process; every later call reuses the instance."""
+    return TestSettings()
+
+
+@pytest.fixture(scope="session")
 def mock_sentence_transformer():
-    """Mock the SentenceTransformer module to avoid loading the real model during tests."""
-    mock_model = MagicMock()
-    mock_model.encode.return_value = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
-
-    with patch("sentence_transformers.SentenceTransformer", return_value=mock_model):
-        yield mock_model
-
-@pytest.fixture(autouse=True)
-def mock_aws_credentials():
-    """Mock AWS credentials to avoid actual AWS calls during testing."""
-    with patch("server.src.services.aws_refresh_service.CredentialStore.get_credentials", return_value=mock_credentials):
+    """The fake embedding model installed in place of SentenceTransformer."""
+    return FakeEmbedder()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _global_patches(mock_sentence_transformer):
+    """
+    Patches every test needs, applied once per session and undone at teardown:
+    no real embedding model is loaded and no real OpenAI client is built.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("sentence_transformers.SentenceTransformer",
+                   lambda *args, **kwargs: mock_sentence_transformer)
+        # generation_service imports the SDK inside get_openai_client, so patch it at the source
+        mp.setattr("openai.OpenAI", FakeOpenAIClient)
         yield
 
-@pytest.fixture(autouse=True)
-def mock_bedrock_client():
-    """Mock the Bedrock client factory to avoid AWS calls during testing."""
-    mock_client = MagicMock()
-    mock_client.invoke_model.return_value = {
-        "body": MagicMock(read=lambda: '{"results": [{"outputText": "test response"}]}')
-    }
-    with patch("boto3.client", return_value=mock_client):
-        yield mock_client
-
-@pytest.fixture(autouse=True)
-def mock_settings(monkeypatch):
+@pytest.fixture(scope="session", autouse=True)
+def mock_settings():
     """Mock the settings with test values."""
-    from server.src.config import Settings
-    
-    class TestSettings(Settings):
-        class Config:
-            validate_assignment = True
-            arbitrary_types_allowed = True
-            
-        # Override the parent class to provide default values for testing
-        environment: str = "test"
-        app_name: str = "rag-app"
-        debug: bool = True
-        
-        # Database settings
-        postgres_host: str = "localhost"
-        postgres_db: str = "test_db"
-        postgres_user: str = "test_user"
-        postgres_password: str = "test_password"
-        postgres_port: int = 5432
-        
-        # API settings
-        arxiv_api_url: AnyHttpUrl = "https://export.arxiv.org/api/query"
-        data_path: str = "./data"
-        
-        # Model settings
-        llm_provider: str = "openai"
-        embedding_provider: str = "sentence-transformer"
-        temperature: float = 0.7
-        top_p: float = 0.9
-        max_tokens: int = 1000
-        
-        # OpenAI settings
-        openai_api_key: str = "test-key"
-        openai_model: str = "gpt-3.5-turbo"
-        openai_embedding_model: str = "text-embedding-ada-002"
-        
-        # AWS settings
-        aws_region: str = "us-east-1"
-        aws_access_key_id: SecretStr = SecretStr("test-key")
-        aws_secret_access_key: SecretStr = SecretStr("test-secret")
-        aws_session_token: Optional[SecretStr] = None
-        bedrock_model_id: str = "test-model"
-        bedrock_embedding_model_id: str = "test-embedding-model"
-        
-        # Ollama settings
-        #ollama_url: AnyHttpUrl = "http://localhost:11434"
-        #ollama_model: str = "llama2"
-        #ollama_embedding_model: str = "llama2"
-        
-        # Opik settings
-        opik_api_key: str = "test-key"
-        opik_workspace: str = "test-workspace"
-        opik_project_name: str = "rag-app-test"
-
-        # RAG config
-        rag_config: Dict[str, Any] = {}
-
-    test_settings = TestSettings()
-    monkeypatch.setattr("server.src.config.settings", test_settings)
-    return test_settings
-
-# Import after all mocks are defined
-from server.src.services.generation_service import generate_response, call_llm
+    test_settings = _make_settings()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("server.src.config.settings", test_settings)
+        yield test_settings
 
-@pytest.fixture
+
+@pytest.fixture(scope="session")
 def mock_query():
     """Fixture to provide a sample query for testing."""
-    return "Tell me about perovskites in solar cells."
+    return _MOCK_QUERY
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_chunks():
     """Fixture to provide mock retrieved document chunks for generation tests."""
-    return [
-        {"text": "Perovskite materials are used in solar cells."},
-        {"text": "Perovskites have unique electronic properties."},
-        {"text": "The efficiency of perovskite solar cells has improved."},
-    ]
+    return _MOCK_CHUNKS
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_config():
     """Fixture for mock configuration settings."""
-    return {
-        "max_tokens": 150,
-        "temperature": 0.7,
-    }
+    return _MOCK_CONFIG
 
 
 @pytest.fixture
-def mock_generate_response():
+def mock_generate_response(monkeypatch):
     """Fixture that mocks the LLM generation process in the call_llm function."""
-    with patch("server.src.services.generation_service.call_llm") as mock_gen:
-        yield mock_gen
+    fake = FakeCallable()
+    monkeypatch.setattr("server.src.services.generation_service.call_llm", fake)
+    return fake
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def db_config():
-    """Fixture for database configuration."""
-    return {
-        "dbname": "test_db",
-        "user": "test_user",
-        "password": "test_password",
-        "host": "localhost",
-        "port": "5432",
-    }
-
-
-@pytest.fixture(autouse=True)
-def setup_test_database(db_config):
-    """Fixture to set up the test database with required tables."""
+    """
+    Fixture for database configuration.
+
+    Under pytest-xdist each worker gets its own schema on the search_path, so
+    parallel workers never share the papers table.
+    """
+    if _XDIST_WORKER is None:
+        return _DB_CONFIG
+    return MappingProxyType({
+        **_DB_CONFIG,
+        "options": f"-c search_path={_TEST_SCHEMA},public",
+    })
+
+
+@pytest.fixture(scope="session")
+def pg_conn(db_config):
+    """One Postgres connection shared by every fixture and helper in the session."""
     conn = psycopg2.connect(**db_config)
-    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-    
-    try:
-        cursor = conn.cursor()
-        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS papers (
-            id SERIAL PRIMARY KEY,
-            title TEXT,
-            chunk TEXT,
-            embedding vector(384)
-        );
-        """)
-        
-        cursor.execute("""
-        INSERT INTO papers (title, chunk, embedding)
-        VALUES 
-            ('Test Paper 1', 'Perovskite materials are used in solar cells.', '[0.1]'::vector(384)),
-            ('Test Paper 2', 'Perovskites have unique electronic properties.', '[0.1]'::vector(384)),
-            ('Test Paper 3', 'The efficiency of perovskite solar cells has improved.', '[0.1]'::vector(384))
-        ON CONFLICT DO NOTHING;
-        """)
-        
-        conn.commit()
-    except Exception as e:
-        print(f"Error setting up test database: {e}")
-        conn.rollback()
-    finally:
-        cursor.close()
-        conn.close()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope="session")
+def setup_test_database(pg_conn):
+    """
+    Fixture to set up the test database with required tables.
+
+    The DDL and seed rows are idempotent and never change between tests, so this
+    runs once per session, in a single transaction, on the shared connection.
+    Only tests that touch Postgres request it; nothing else pays for the connect.
+    """
+    # `with conn` commits the whole block as one transaction (rolls back on error);
+    # a failure is raised here, as a setup error, not as a later assertion failure
+    with pg_conn, pg_conn.cursor() as cursor:
+        # Rows are bound client-side, so DDL + seed go over in a single round-trip
+        values = b",".join(
+            cursor.mogrify("(%s, %s, %s::vector(384))", row) for row in SEED_ROWS
+        )
+        # TRUNCATE keeps the seed exact when the database outlives a session
+        cursor.execute(
+            SCHEMA_SQL.encode()
+            + b"TRUNCATE papers RESTART IDENTITY;"
+            + b"INSERT INTO papers (title, chunk, embedding) VALUES "
+            + values
+            + b";"
+        )
+
+    yield pg_conn
+
+
+@pytest.fixture
+def pg_cursor(pg_conn):
+    """
+    Cursor on the shared connection, isolated per test: everything it writes is
+    rolled back to a savepoint when the test finishes.
+    """
+    with pg_conn.cursor() as cursor:
+        cursor.execute("SAVEPOINT test_case;")
+        try:
+            yield cursor
+        finally:
+            cursor.execute("ROLLBACK TO SAVEPOINT test_case;")
+            pg_conn.rollback()
@@ -1,124 +1,120 @@
 import pytest
-from server.src.services.generation_service import generate_response
-
-# ─────────────────────────────────────────────────────────────
-# 🧪 TEST: Basic functionality
-# ─────────────────────────────────────────────────────────────
-
-
-def test_generate_response_basic(
-    mock_query, mock_chunks, mock_config, mock_generate_response
-):
-    """
-    ✅ This tests a successful response from the LLM given valid inputs.
-    """
-    mock_generate_response.return_value = {
-        "response": "Here is information about perovskites: They are used in solar cells.",
-        "response_tokens_per_second": None
-    }
-
-    response = generate_response(mock_query, mock_chunks, **mock_config)
-
-    # Assert full structure + content
-    assert isinstance(response, dict)
-    assert "response" in response
-    assert "query" in response
-    assert "context" in response
-    assert "perovskites" in response["response"]
-    assert "solar cells" in response["response"]
+from unittest.mock import AsyncMock
+from server.src.services import generation_service
+from server.src.services.generation_service import agenerate_response, generate_response
 
+LONG_QUERY = "Perovskites " * 100
 
 # ─────────────────────────────────────────────────────────────
-# 🧪 TEST: Edge case when no context is passed
+# 🧪 CASES: mocked LLM reply, inputs and expected phrases
 # ─────────────────────────────────────────────────────────────
-def test_generate_response_empty_chunks(
-    mock_query, mock_config, mock_generate_response
-):
-    """
-    ✅ This simulates what happens when no document chunks are available.
-    """
-    mock_generate_response.return_value = {
-        "response": "No relevant information found for perovskites in solar cells.",
-        "response_tokens_per_second": None
-    }
-
-    response = generate_response(mock_query, [], **mock_config)
-
-    assert isinstance(response, dict)
-    assert "response" in response
-    assert "No relevant information found" in response["response"]
+# Omitted `query` / `chunks` / `config` keys fall back to the shared fixtures.
+CASES = [
+    # ✅ A successful response from the LLM given valid inputs.
+    pytest.param(
+        {
+            "reply": "Here is information about perovskites: They are used in solar cells.",
+            "expected": ["perovskites", "solar cells"],
+        },
+        id="basic",
+    ),
+    # ✅ What happens when no document chunks are available.
+    pytest.param(
+        {
+            "reply": "No relevant information found for perovskites in solar cells.",
+            "chunks": (),
+            "expected": ["No relevant information found"],
+        },
+        id="empty_chunks",
+    ),
+    # ✅ A high temperature still yields a coherent, bounded response.
+    pytest.param(
+        {
+            "reply": "Perovskites might revolutionize solar cells with surprising applications.",
+            "config": {"max_tokens": 150, "temperature": 1.5},
+            "expected": [],
+        },
+        id="high_temperature",
+    ),
+    # ✅ Long user queries don't break formatting or trigger truncation.
+    pytest.param(
+        {
+            "reply": "Perovskites are materials used in solar cells.",
+            "query": LONG_QUERY,
+            "expected": ["Perovskites"],
+        },
+        id="long_query",
+    ),
+    # ✅ RAG response using multiple retrieved documents.
+    pytest.param(
+        {
+            "reply": (
+                "Perovskites are used in solar cells and have unique properties. "
+                "Their efficiency has recently improved."
+            ),
+            "expected": [
+                "used in solar cells",
+                "unique properties",
+                "efficiency has recently improved",
+            ],
+        },
+        id="multiple_chunks",
+    ),
+]
 
 
 # ─────────────────────────────────────────────────────────────
-# 🧪 TEST: Response behavior under high randomness
+# 🧪 TEST: generate_response across all cases
 # ─────────────────────────────────────────────────────────────
-def test_generate_response_high_temperature(
-    mock_query, mock_chunks, mock_generate_response
+@pytest.mark.parametrize("case", CASES)
+def test_generate_response(
+    case, mock_query, mock_chunks, mock_config, mock_generate_response
 ):
     """
-    ✅ Uses a high temperature to ensure the system still responds coherently.
+    ✅ Checks response structure and content for each mocked LLM reply.
     """
     mock_generate_response.return_value = {
-        "response": "Perovskites might revolutionize solar cells with surprising applications.",
+        "response": case["reply"],
         "response_tokens_per_second": None
     }
 
-    response = generate_response(
-        mock_query, mock_chunks, max_tokens=150, temperature=1.5
-    )
-
-    assert isinstance(response, dict)
-    assert "response" in response
-    assert len(response["response"].split()) <= 150
-
-
-# ─────────────────────────────────────────────────────────────
-# 🧪 TEST: Extremely long query
-# ─────────────────────────────────────────────────────────────
-def test_generate_response_long_query(mock_chunks, mock_generate_response):
-    """
-    ✅ Checks if long user queries break formatting or trigger truncation.
-    """
-    long_query = "Perovskites " * 100
-
-    mock_generate_response.return_value = {
-        "response": "Perovskites are materials used in solar cells.",
-        "response_tokens_per_second": None
-    }
+    query = case.get("query", mock_query)
+    chunks = case.get("chunks", mock_chunks)
+    config = case.get("config", mock_config)
 
-    response = generate_response(
-        long_query, mock_chunks, max_tokens=150, temperature=0.7
-    )
+    response = generate_response(query, chunks, **config)
 
+    # Assert full structure + content
     assert isinstance(response, dict)
     assert "response" in response
-    assert "Perovskites" in response["response"]
+    assert "query" in response
+    assert "context" in response
+    for phrase in case["expected"]:
+        assert phrase in response["response"]
     assert len(response["response"].split()) <= 150
 
 
 # ─────────────────────────────────────────────────────────────
-# 🧪 TEST: Behavior with multiple chunks
+# 🧪 TEST: agenerate_response matches the sync path
 # ─────────────────────────────────────────────────────────────
-def test_generate_response_with_multiple_chunks(
-    mock_query, mock_chunks, mock_generate_response
+@pytest.mark.asyncio
+@pytest.mark.parametrize("case", CASES)
+async def test_agenerate_response(
+    case, mock_query, mock_chunks, mock_config, monkeypatch
 ):
     """
-    ✅ Simulates RAG response using multiple retrieved documents.
+    ✅ The async entry point returns the same structure via acall_llm.
     """
-    mock_generate_response.return_value = {
-        "response": (
-            "Perovskites are used in solar cells and have unique properties. "
-            "Their efficiency has recently improved."
-        ),
-        "response_tokens_per_second": None
-    }
+    reply = {"response": case["reply"], "response_tokens_per_second": None}
+    monkeypatch.setattr(generation_service, "acall_llm", AsyncMock(return_value=reply))
 
-    response = generate_response(
-        mock_query, mock_chunks, max_tokens=150, temperature=0.7
-    )
+    query = case.get("query", mock_query)
+    chunks = case.get("chunks", mock_chunks)
+    config = case.get("config", mock_config)
 
-    assert isinstance(response, dict)
-    assert "response" in response
-    assert "used in solar cells" in response["response"]
-    assert "unique properties" in response["response"]
-    assert "efficiency has recently improved" in response["response"]
+    response = await agenerate_response(query, chunks, **config)
+
+    assert response["query"] == query
+    assert "context" in response
+    for phrase in case["expected"]:
+        assert phrase in response["response"]
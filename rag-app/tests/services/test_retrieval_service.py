@@ -1,32 +1,48 @@
-import pytest
-from server.src.services.retrieval_service import retrieve_top_k_chunks
-from unittest.mock import patch, MagicMock
+from server.src.services.retrieval_service import retrieve_top_k_chunks, retrieve_top_k_chunks_soa
 import numpy as np
+from tests._fakes import EMBEDDING_384, SEED_EMBEDDINGS, SEED_PAPERS
+from tests._vectors import ip_distance_top_k
 
-def test_retrieve_top_k_chunks(db_config):
-    """Test the retrieval service with mock embeddings."""
+def test_retrieve_top_k_chunks(db_config, setup_test_database, pg_cursor):
+    """Test the retrieval service; the session fake embeds every query as EMBEDDING_384."""
     # Mock query and top_k value
     query = "perovskite"
     top_k = 5
 
-    # Create a mock for the entire SentenceTransformer module
-    mock_model = MagicMock()
-    mock_model.encode.return_value = np.array([0.1] * 384)  # Create a 384-dimensional vector
-    
-    # Mock the entire module to avoid loading the real model
-    with patch("sentence_transformers.SentenceTransformer", return_value=mock_model):
-        # Call the function
-        try:
-            documents = retrieve_top_k_chunks(query, top_k, db_config)
-
-            # Assertions
-            assert isinstance(documents, list)
-            assert len(documents) <= top_k
-
-            for doc in documents:
-                assert "id" in doc
-                assert "title" in doc
-                assert "chunk" in doc
-                assert "similarity_score" in doc
-        except Exception as e:
-            pytest.fail(f"Test failed with error: {str(e)}")
+    # Ids the seed rows were given, so the reference ranking can be stated in ids
+    pg_cursor.execute("SELECT title, id FROM papers;")
+    seeded_ids = dict(pg_cursor.fetchall())
+
+    # The `<#>` ranking is only cosine ranking for unit-length vectors
+    np.testing.assert_allclose(np.linalg.norm(SEED_EMBEDDINGS, axis=1), 1.0, rtol=1e-5)
+    np.testing.assert_allclose(np.linalg.norm(EMBEDDING_384), 1.0, rtol=1e-5)
+
+    # Reference ranking over the seeded rows alone, independent of what was returned
+    indices, expected_scores = ip_distance_top_k(SEED_EMBEDDINGS, EMBEDDING_384, top_k)
+    expected_ids = [seeded_ids[SEED_PAPERS[i][0]] for i in indices]
+
+    documents = retrieve_top_k_chunks(query, top_k, db_config)
+
+    # Assertions
+    assert isinstance(documents, list)
+    assert len(documents) == min(top_k, len(SEED_PAPERS))
+
+    for doc in documents:
+        assert "id" in doc
+        assert "title" in doc
+        assert "chunk" in doc
+        assert "similarity_score" in doc
+
+    # Same rows, in the same order, with the same scores as the NumPy reference
+    assert [doc["id"] for doc in documents] == expected_ids
+    scores = np.fromiter((doc["similarity_score"] for doc in documents), dtype=np.float32)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-4, atol=1e-6)
+    assert np.all((scores >= 0.0) & (scores <= 2.0))
+
+    # The column-oriented view carries the same rows in the same order
+    columns = retrieve_top_k_chunks_soa(query, top_k, db_config)
+    assert columns["ids"].dtype == np.int64
+    assert columns["scores"].dtype == np.float32
+    assert columns["ids"].tolist() == expected_ids
+    assert columns["titles"] == [doc["title"] for doc in documents]
+    np.testing.assert_allclose(columns["scores"], scores)
@@ -0,0 +1,38 @@
+import numpy as np
+from server.src.services.semantic_cache import SemanticCache
+
+
+def _unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_semantic_cache_hits_paraphrase_in_same_scope():
+    """A near-identical embedding hits, but only within the scope it was stored under."""
+    cache = SemanticCache(max_entries=4, ttl=60)
+    cache.put(_unit(1, 0, 0), "scope", {"response": "cached"})
+
+    assert cache.get(_unit(1, 0.05, 0), "scope", threshold=0.95) == {"response": "cached"}
+    assert cache.get(_unit(1, 0.05, 0), "other-scope", threshold=0.95) is None
+    assert cache.get(_unit(0, 1, 0), "scope", threshold=0.95) is None
+
+
+def test_semantic_cache_evicts_least_recently_used():
+    """When full, the entry that was used longest ago makes room for the new one."""
+    cache = SemanticCache(max_entries=2, ttl=60)
+    cache.put(_unit(1, 0, 0), "scope", {"response": "a"})
+    cache.put(_unit(0, 1, 0), "scope", {"response": "b"})
+    cache.get(_unit(1, 0, 0), "scope", threshold=0.95)  # refresh "a"
+    cache.put(_unit(0, 0, 1), "scope", {"response": "c"})
+
+    assert cache.get(_unit(0, 1, 0), "scope", threshold=0.95) is None
+    assert cache.get(_unit(1, 0, 0), "scope", threshold=0.95) == {"response": "a"}
+    assert cache.get(_unit(0, 0, 1), "scope", threshold=0.95) == {"response": "c"}
+
+
+def test_semantic_cache_expires_entries():
+    """Entries older than the TTL are never served."""
+    cache = SemanticCache(max_entries=2, ttl=-1)
+    cache.put(_unit(1, 0, 0), "scope", {"response": "stale"})
+
+    assert cache.get(_unit(1, 0, 0), "scope", threshold=0.95) is None